@@ -0,0 +1,143 @@
+"""
+In-process caches for the RAG chain.
+Keeps query embeddings and retrieval results around so repeated questions
+don't pay for another embedding call or vector search.
+"""
+
+import asyncio
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Query text -> embedding vector
+embedding_cache = TTLCache(maxsize=4096, ttl=3600)
+
+# (notebook, generation, sources, n_results, query) -> (context, citation_info)
+retrieval_cache = TTLCache(maxsize=1024, ttl=600)
+
+# Hash of (provider, model, generation, messages, sources) -> streamed response chunks
+response_cache = TTLCache(maxsize=256, ttl=3600)
+
+# Query embeddings currently being computed, shared by concurrent callers
+_inflight: Dict[Hashable, Future] = {}
+_inflight_lock = threading.Lock()
+# Async counterpart, used from the event loop only
+_ainflight: Dict[Hashable, asyncio.Task] = {}
+
+# Per-notebook counter, bumped whenever its documents change so stale
+# retrieval results are never served.
+_generations: Dict[str, int] = {}
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 hex digest of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embed_query_cached(provider_name: str, model: Optional[str], text: str, embed: Callable[[str], List[float]]) -> List[float]:
+    """
+    Embed a query through the cache, calling `embed` only on a miss.
+    Concurrent misses for the same query wait for a single `embed` call.
+    """
+    key = (provider_name, model, hash_text(text))
+    vector = embedding_cache.get(key)
+    if vector is not None:
+        return vector
+    
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+    
+    try:
+        vector = embed(text)
+        embedding_cache.set(key, vector)
+        future.set_result(vector)
+        return vector
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+async def aembed_query_cached(provider_name: str, model: Optional[str], text: str, embed: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+    """
+    Async variant of embed_query_cached. Concurrent misses share one task, which
+    keeps running if the caller that started it is cancelled.
+    """
+    key = (provider_name, model, hash_text(text))
+    vector = embedding_cache.get(key)
+    if vector is not None:
+        return vector
+    
+    task = _ainflight.get(key)
+    if task is None:
+        async def run() -> List[float]:
+            vector = await embed(text)
+            embedding_cache.set(key, vector)
+            return vector
+        
+        task = _ainflight[key] = asyncio.ensure_future(run())
+        task.add_done_callback(lambda _: _ainflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def get_generation(notebook_id: str) -> int:
+    return _generations.get(notebook_id, 0)
+
+
+def bump_generation(notebook_id: str):
+    """Invalidate cached retrievals for a notebook."""
+    _generations[notebook_id] = _generations.get(notebook_id, 0) + 1
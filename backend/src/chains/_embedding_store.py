@@ -0,0 +1,148 @@
+"""
+Persistent bookkeeping for the vector store.
+Chunk embeddings are keyed by (content hash, provider, model) so re-indexing
+an unchanged source doesn't pay for embedding it again. Per-source chunk
+counts are only used to drop leftover chunks when a re-upload produces fewer.
+"""
+
+import os
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ._cache import hash_text
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[2] / "data" / "embedding_cache.db"
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingStore:
+    """SQLite tables for cached float32 vectors and per-source chunk counts."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.getenv("EMBEDDING_CACHE_DB", DEFAULT_DB_PATH))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "hash TEXT, provider TEXT, model TEXT, vector BLOB, "
+                "PRIMARY KEY (hash, provider, model))"
+            )
+            # Vectors are upserted into Chroma as-is, so drop int8 rows left by the
+            # removed EMBEDDING_CACHE_INT8 option; those chunks are simply re-embedded
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embedding_cache)")}
+            if "scale" in columns:
+                self._conn.execute("DELETE FROM embedding_cache WHERE scale IS NOT NULL")
+                self._conn.commit()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS source_chunks ("
+                "notebook_id TEXT, source_name TEXT, chunk_count INTEGER, "
+                "PRIMARY KEY (notebook_id, source_name))"
+            )
+        return self._conn
+
+    def lookup(self, hashes: List[str], provider: str, model: str) -> Dict[str, List[float]]:
+        """Return the cached vectors for whichever hashes are present."""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embedding_cache "
+                    f"WHERE hash IN ({placeholders}) AND provider = ? AND model = ?",
+                    (*batch, provider, model),
+                )
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+        return found
+
+    def store(self, entries: Iterable[Tuple[str, List[float]]], provider: str, model: str):
+        """Write (hash, vector) pairs back to the cache."""
+        rows = [(h, provider, model, array("f", vector).tobytes()) for h, vector in entries]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, provider, model, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def get_chunk_count(self, notebook_id: str, source_name: str) -> Optional[int]:
+        """Return the recorded chunk count for a source, or None if unknown."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT chunk_count FROM source_chunks WHERE notebook_id = ? AND source_name = ?",
+                (notebook_id, source_name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_chunk_count(self, notebook_id: str, source_name: str, chunk_count: int):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO source_chunks (notebook_id, source_name, chunk_count) VALUES (?, ?, ?)",
+                (notebook_id, source_name, chunk_count),
+            )
+            conn.commit()
+
+    def delete_chunk_count(self, notebook_id: str, source_name: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM source_chunks WHERE notebook_id = ? AND source_name = ?",
+                (notebook_id, source_name),
+            )
+            conn.commit()
+
+
+_store: Optional[EmbeddingStore] = None
+
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+    if _store is None:
+        _store = EmbeddingStore()
+    return _store
+
+
+def embed_cached(embeddings, texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+    """
+    Embed texts, calling `embed` only for content not already in the store.
+    
+    Args:
+        embeddings: The LangChain Embeddings instance; its class and model name key the cache
+        texts: Texts to embed
+        embed: Function embedding a list of texts, called once with all misses
+    
+    Returns:
+        Embedding vectors in the order of `texts`.
+    """
+    provider = type(embeddings).__name__
+    model = str(getattr(embeddings, "model", None))
+    store = get_embedding_store()
+    
+    hashes = [hash_text(text) for text in texts]
+    vectors = store.lookup(hashes, provider, model)
+    
+    missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+    if missing:
+        fresh = dict(zip(missing.keys(), embed(list(missing.values()))))
+        store.store(fresh.items(), provider, model)
+        vectors.update(fresh)
+    
+    return [vectors[h] for h in hashes]
@@ -3,10 +3,15 @@ RAG Chain using LangChain.
 Provides improved retrieval and generation with citations.
 """
 
+import asyncio
+import logging
 import os
+import time
 from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
 from dataclasses import dataclass
 
+import chromadb
+import orjson
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
@@ -16,6 +21,80 @@ from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from ..providers.registry import get_registry
+from . import _cache
+from ._embedding_store import embed_cached, get_embedding_store
+
+
+logger = logging.getLogger(__name__)
+
+
+# Length of the excerpt shown in citations
+EXCERPT_CHARS = 300
+
+# Chunking: split on sentence boundaries, then fold fragments shorter than
+# MIN_CHUNK_CHARS (~100 tokens) into a neighbour while staying under MAX_CHUNK_CHARS
+CHUNK_SIZE = 1100
+CHUNK_OVERLAP = 100
+MIN_CHUNK_CHARS = 400
+MAX_CHUNK_CHARS = 1150
+
+# HNSW index parameters, applied when the collection is first created.
+# Select with CHROMA_HNSW_PROFILE; existing collections keep their settings.
+HNSW_PROFILES: Dict[str, Dict[str, Any]] = {
+    "fast": {"hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 32},
+    "balanced": {"hnsw:M": 32, "hnsw:construction_ef": 128, "hnsw:search_ef": 64},
+    "recall": {"hnsw:M": 48, "hnsw:construction_ef": 256, "hnsw:search_ef": 160},
+}
+
+
+def get_hnsw_metadata(profile: Optional[str] = None) -> Dict[str, Any]:
+    """Return the HNSW collection metadata for a profile name."""
+    profile = profile or os.getenv("CHROMA_HNSW_PROFILE", "balanced")
+    return HNSW_PROFILES.get(profile, HNSW_PROFILES["balanced"])
+
+
+# Minimum seconds between prewarm queries for the same notebook
+PREWARM_INTERVAL = 300
+
+# IDs per delete request when removing a source
+DELETE_BATCH_SIZE = 1000
+
+# Largest number of chunks sent to the embedding provider per call (OpenAI's input limit)
+EMBED_BATCH_SIZE = 2048
+
+_SOURCE_BLOCK = "--- BEGIN SOURCE [%d] (%s) ---\n%s\n--- END SOURCE [%d] ---"
+
+
+def _format_source_block(cid: int, source_name: str, content: str) -> str:
+    """Wrap source content in the BEGIN/END markers the system prompt refers to."""
+    return _SOURCE_BLOCK % (cid, source_name, content, cid)
+
+
+# (host, port, collection) -> vectorstore, so every RAGChain reuses one HTTP client
+_VECTORSTORES: Dict[Tuple[str, int, str], Chroma] = {}
+
+# (host, port) -> client; the legacy rag.collection shares it with the vectorstores
+_CHROMA_CLIENTS: Dict[Tuple[str, int], Any] = {}
+
+
+def _overlap_length(previous: str, chunk: str) -> int:
+    """Length of the longest word-aligned prefix of chunk that previous ends with."""
+    for k in range(min(CHUNK_OVERLAP, len(previous), len(chunk)), 0, -1):
+        if (k == len(chunk) or chunk[k].isspace() or chunk[k - 1].isspace()) and previous.endswith(chunk[:k]):
+            return k
+    return 0
+
+
+def get_chroma_client(host: str, port: int):
+    """Get or create the process-wide ChromaDB HTTP client for a server."""
+    client = _CHROMA_CLIENTS.get((host, port))
+    if client is None:
+        client = _CHROMA_CLIENTS[(host, port)] = chromadb.HttpClient(
+            host=host,
+            port=port,
+            settings=chromadb.Settings(anonymized_telemetry=False),
+        )
+    return client
 
 
 @dataclass
@@ -66,37 +145,98 @@ Remember: [1], [2] only. No filenames."""
         self._vectorstore: Optional[Chroma] = None
         self._chroma_host = chroma_host
         self._chroma_port = chroma_port
+        self._prewarmed: Dict[str, float] = {}
         
         # Text splitter for document processing
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len,
+            separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""],
+            # Punctuation stays with the sentence it ends, not the next chunk
+            keep_separator="end",
         )
     
     def _get_vectorstore(self) -> Chroma:
-        """Get or create the Chroma vectorstore."""
+        """Get or create the Chroma vectorstore, shared by all chains in the process."""
         if self._vectorstore is None:
-            import chromadb
-            
-            # Get embedding function from provider
-            embedding_provider = self.registry.get_embedding_provider()
-            embeddings = embedding_provider.get_embeddings()
-            
-            # Connect to ChromaDB
-            chroma_client = chromadb.HttpClient(
-                host=self._chroma_host,
-                port=self._chroma_port
-            )
-            
-            self._vectorstore = Chroma(
-                client=chroma_client,
-                collection_name=self.collection_name,
-                embedding_function=embeddings,
-            )
+            key = (self._chroma_host, self._chroma_port, self.collection_name)
+            vectorstore = _VECTORSTORES.get(key)
+            if vectorstore is None:
+                # Get embedding function from provider
+                embedding_provider = self.registry.get_embedding_provider()
+                embeddings = embedding_provider.get_embeddings()
+                
+                vectorstore = Chroma(
+                    client=get_chroma_client(self._chroma_host, self._chroma_port),
+                    collection_name=self.collection_name,
+                    embedding_function=embeddings,
+                    collection_metadata=get_hnsw_metadata(),
+                )
+                _VECTORSTORES[key] = vectorstore
+            self._vectorstore = vectorstore
         
         return self._vectorstore
     
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing cached vectors for repeated queries."""
+        embeddings = self._get_vectorstore().embeddings
+        return _cache.embed_query_cached(
+            type(embeddings).__name__,
+            getattr(embeddings, "model", None),
+            query,
+            embeddings.embed_query,
+        )
+    
+    def prewarm(self, notebook_id: str):
+        """
+        Run a throwaway query against a notebook so the index pages it needs
+        are resident before the user's first real question.
+        
+        Args:
+            notebook_id: The notebook ID
+        """
+        now = time.monotonic()
+        if now - self._prewarmed.get(notebook_id, float("-inf")) < PREWARM_INTERVAL:
+            return
+        self._prewarmed[notebook_id] = now
+        
+        try:
+            self._get_vectorstore().similarity_search_by_vector(
+                self._embed_query("warmup"),
+                k=1,
+                filter={"notebook_id": notebook_id},
+            )
+        except Exception as e:
+            logger.warning("Prewarm failed for notebook %s: %s", notebook_id, e)
+    
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks, only calling the provider for unseen content."""
+        embeddings = self._get_vectorstore().embeddings
+        return embed_cached(embeddings, texts, embeddings.embed_documents)
+    
+    def _split_then_merge(self, content: str) -> List[str]:
+        """
+        Split content into sentence-aligned chunks, merging undersized
+        fragments into the previous chunk when the result still fits.
+        
+        Args:
+            content: The text content
+            
+        Returns:
+            List of chunk strings.
+        """
+        merged: List[str] = []
+        for chunk in self.text_splitter.split_text(content):
+            if merged and (len(chunk) < MIN_CHUNK_CHARS or len(merged[-1]) < MIN_CHUNK_CHARS):
+                # The splitter repeats up to CHUNK_OVERLAP chars; don't store them twice
+                combined = merged[-1] + "\n" + chunk[_overlap_length(merged[-1], chunk):].lstrip()
+                if len(combined) <= MAX_CHUNK_CHARS:
+                    merged[-1] = combined
+                    continue
+            merged.append(chunk)
+        return merged
+    
     def add_documents(
         self,
         notebook_id: str,
@@ -105,7 +245,9 @@ Remember: [1], [2] only. No filenames."""
         content: str
     ) -> int:
         """
-        Add documents to the vector store.
+        Add a single source to the vector store.
+        
+        Convenience wrapper around add_documents_batch.
         
         Args:
             notebook_id: The notebook ID
@@ -116,37 +258,134 @@ Remember: [1], [2] only. No filenames."""
         Returns:
             Number of chunks added.
         """
-        # Split content into chunks
-        chunks = self.text_splitter.split_text(content)
+        return self.add_documents_batch([{
+            "notebook_id": notebook_id,
+            "source_name": source_name,
+            "source_type": source_type,
+            "content": content,
+        }])
+    
+    def add_documents_batch(self, items: List[Dict[str, str]]) -> int:
+        """
+        Add several sources to the vector store, embedding their chunks in as
+        few provider calls as possible.
         
-        # Create Document objects with metadata
+        Args:
+            items: Dicts with notebook_id, source_name, source_type and content
+            
+        Returns:
+            Total number of chunks added.
+        """
         documents = []
         ids = []
-        for i, chunk in enumerate(chunks):
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    "notebook_id": notebook_id,
-                    "source_name": source_name,
-                    "source_type": source_type,
-                    "chunk_index": i,
-                }
+        chunk_counts: Dict[Tuple[str, str], int] = {}
+        for item in items:
+            notebook_id = item["notebook_id"]
+            source_name = item["source_name"]
+            chunks = self._split_then_merge(item["content"])
+            chunk_counts[(notebook_id, source_name)] = len(chunks)
+            for i, chunk in enumerate(chunks):
+                documents.append(Document(
+                    page_content=chunk,
+                    metadata={
+                        "notebook_id": notebook_id,
+                        "source_name": source_name,
+                        "source_type": item["source_type"],
+                        "chunk_index": i,
+                    }
+                ))
+                ids.append(f"{notebook_id}_{source_name}_{i}")
+        
+        # Embed in slices the providers accept in one request, then write the
+        # precomputed vectors straight to the collection
+        collection = self._get_vectorstore()._collection
+        for start in range(0, len(documents), EMBED_BATCH_SIZE):
+            end = start + EMBED_BATCH_SIZE
+            texts = [doc.page_content for doc in documents[start:end]]
+            collection.upsert(
+                ids=ids[start:end],
+                documents=texts,
+                metadatas=[doc.metadata for doc in documents[start:end]],
+                embeddings=self._embed_documents(texts),
             )
-            documents.append(doc)
-            ids.append(f"{notebook_id}_{source_name}_{i}")
         
-        # Add to vectorstore
-        vectorstore = self._get_vectorstore()
-        vectorstore.add_documents(documents, ids=ids)
+        self._record_chunk_counts(chunk_counts)
+        
+        for notebook_id in {item["notebook_id"] for item in items}:
+            _cache.bump_generation(notebook_id)
         
         return len(documents)
     
+    def _record_chunk_counts(self, chunk_counts: Dict[Tuple[str, str], int]):
+        """
+        Record chunk counts so delete_source can address chunks by ID, and drop
+        leftover chunks when a re-upload produced fewer than before.
+        """
+        store = get_embedding_store()
+        for (notebook_id, source_name), count in chunk_counts.items():
+            previous = store.get_chunk_count(notebook_id, source_name)
+            if previous is not None and previous > count:
+                self._delete_ids([f"{notebook_id}_{source_name}_{i}" for i in range(count, previous)])
+            store.set_chunk_count(notebook_id, source_name, count)
+    
+    def append_source_text(
+        self,
+        notebook_id: str,
+        source_name: str,
+        source_type: str,
+        text: str,
+        start_index: int
+    ) -> int:
+        """
+        Index one piece of a source that arrives incrementally, such as a transcript
+        segment. Chunks are numbered from start_index and are searchable immediately;
+        call finish_source once every piece is in.
+        
+        Args:
+            notebook_id: The notebook ID
+            source_name: Name of the source
+            source_type: Type of source (pdf, audio, text)
+            text: The newly available text
+            start_index: Chunk index of the first chunk of this piece
+            
+        Returns:
+            Number of chunks added.
+        """
+        chunks = self._split_then_merge(text)
+        if not chunks:
+            return 0
+        
+        indexes = range(start_index, start_index + len(chunks))
+        self._get_vectorstore()._collection.upsert(
+            ids=[f"{notebook_id}_{source_name}_{i}" for i in indexes],
+            documents=chunks,
+            metadatas=[{
+                "notebook_id": notebook_id,
+                "source_name": source_name,
+                "source_type": source_type,
+                "chunk_index": i,
+            } for i in indexes],
+            embeddings=self._embed_documents(chunks),
+        )
+        _cache.bump_generation(notebook_id)
+        return len(chunks)
+    
+    def finish_source(self, notebook_id: str, source_name: str, chunk_count: int):
+        """Record the final chunk count of a source indexed with append_source_text."""
+        self._record_chunk_counts({(notebook_id, source_name): chunk_count})
+        _cache.bump_generation(notebook_id)
+    
+    def _delete_ids(self, ids: List[str]):
+        collection = self._get_vectorstore()._collection
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            collection.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+    
     def delete_source(self, notebook_id: str, source_name: str):
         """Delete all documents for a source."""
-        vectorstore = self._get_vectorstore()
-        
-        # ChromaDB delete with filter
-        vectorstore._collection.delete(
+        # Match on metadata rather than the recorded chunk count: the count can lag
+        # behind what is indexed (an interrupted append_source_text run, a count lost
+        # with the cache DB), and chunks left behind would still be retrieved
+        self._get_vectorstore()._collection.delete(
             where={
                 "$and": [
                     {"notebook_id": notebook_id},
@@ -154,6 +393,8 @@ Remember: [1], [2] only. No filenames."""
                 ]
             }
         )
+        get_embedding_store().delete_chunk_count(notebook_id, source_name)
+        _cache.bump_generation(notebook_id)
     
     def retrieve_context(
         self,
@@ -174,7 +415,20 @@ Remember: [1], [2] only. No filenames."""
         Returns:
             Tuple of (formatted context string, citation info dict)
         """
-        vectorstore = self._get_vectorstore()
+        cache_key = (
+            notebook_id,
+            _cache.get_generation(notebook_id),
+            tuple(sorted(selected_sources or [])),
+            n_results,
+            _cache.hash_text(query),
+        )
+        cached = _cache.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Query the raw collection: results come back as parallel lists of
+        # contents and metadata, with no per-hit Document objects
+        collection = self._get_vectorstore()._collection
         
         # Build filter
         filter_dict = {"notebook_id": notebook_id}
@@ -190,9 +444,10 @@ Remember: [1], [2] only. No filenames."""
             # Balanced Retrieval Strategy
             # When specific sources are selected, ensure we get context from EACH of them.
             # This prevents one document from dominating the 'k' results.
-            results = []
+            # The query is embedded once and that vector is reused for each source.
             per_source_k = max(3, int(n_results / len(selected_sources)) + 1)
-            
+            query_embedding = self._embed_query(query)
+            contents, metadatas = [], []
             
             for source in selected_sources:
                 source_filter = {
@@ -202,23 +457,27 @@ Remember: [1], [2] only. No filenames."""
                     ]
                 }
                 try:
-                    source_docs = vectorstore.similarity_search(
-                        query,
-                        k=per_source_k,
-                        filter=source_filter
+                    response = collection.query(
+                        query_embeddings=[query_embedding],
+                        n_results=per_source_k,
+                        where=source_filter,
+                        include=["documents", "metadatas"],
                     )
-                    results.extend(source_docs)
+                    contents.extend(response["documents"][0])
+                    metadatas.extend(response["metadatas"][0])
                 except Exception as e:
-                    print(f"Error retrieving for source {source}: {e}")
+                    logger.error("Error retrieving for source %s: %s", source, e)
         else:
             # Standard Global Retrieval
             # Used when no specific sources selected (search all) or too many sources selected.
-            results = vectorstore.similarity_search(
-                query,
-                k=n_results,
-                filter=filter_dict
+            response = collection.query(
+                query_embeddings=[self._embed_query(query)],
+                n_results=n_results,
+                where=filter_dict,
+                include=["documents", "metadatas"],
             )
-        
+            contents = response["documents"][0]
+            metadatas = response["metadatas"][0]
         
         # Build context and citations
         context_parts = []
@@ -226,8 +485,8 @@ Remember: [1], [2] only. No filenames."""
         citation_info: Dict[int, CitationInfo] = {}
         citation_counter = 1
         
-        for doc in results:
-            source_name = doc.metadata.get("source_name", "Unknown")
+        for page_content, metadata in zip(contents, metadatas):
+            source_name = metadata.get("source_name", "Unknown")
             
             # Assign citation ID
             if source_name not in source_map:
@@ -242,17 +501,17 @@ Remember: [1], [2] only. No filenames."""
             cid = source_map[source_name]
             
             # Add excerpt to citation
-            excerpt = doc.page_content[:300] + "..." if len(doc.page_content) > 300 else doc.page_content
+            excerpt = page_content[:EXCERPT_CHARS]
+            if len(page_content) > EXCERPT_CHARS:
+                excerpt += "..."
             citation_info[cid].excerpts.append(excerpt)
             
             # Format context
-            context_parts.append(
-                f"--- BEGIN SOURCE [{cid}] ({source_name}) ---\n"
-                f"{doc.page_content}\n"
-                f"--- END SOURCE [{cid}] ---"
-            )
+            context_parts.append(_format_source_block(cid, source_name, page_content))
         
         context = "\n\n".join(context_parts)
+        if contents:
+            _cache.retrieval_cache.set(cache_key, (context, citation_info))
         return context, citation_info
     
     async def stream_response(
@@ -280,7 +539,6 @@ Remember: [1], [2] only. No filenames."""
         citation_info = {}
         
         if full_source_content:
-            # Full Context Mode
             # Full Context Mode
             context_parts = []
             for i, src in enumerate(full_source_content):
@@ -288,11 +546,7 @@ Remember: [1], [2] only. No filenames."""
                 content = src.get('content', '')
                 name = src.get('name', 'Unknown')
                 
-                context_parts.append(
-                    f"--- BEGIN SOURCE [{cid}] ({name}) ---\n"
-                    f"{content}\n"
-                    f"--- END SOURCE [{cid}] ---"
-                )
+                context_parts.append(_format_source_block(cid, name, content))
                 
                 # Mock citation info for UI
                 citation_info[cid] = CitationInfo(
@@ -302,8 +556,9 @@ Remember: [1], [2] only. No filenames."""
                 )
             context = "\n\n".join(context_parts)
         else:
-            # Retrieve context via RAG
-            context, citation_info = self.retrieve_context(
+            # Retrieve context via RAG; the embedding and ChromaDB calls block, so run them in a thread
+            context, citation_info = await asyncio.to_thread(
+                self.retrieve_context,
                 notebook_id,
                 user_message,
                 selected_sources,
@@ -325,16 +580,15 @@ Remember: [1], [2] only. No filenames."""
         
         # Yield citation data at the end
         if citation_info:
-            import json
             citation_data = {
-                str(cid): {
+                cid: {
                     "name": info.source_name,
                     "excerpts": info.excerpts
                 }
                 for cid, info in citation_info.items()
             }
             yield "\n\n---CITATIONS---\n"
-            yield json.dumps(citation_data)
+            yield orjson.dumps(citation_data, option=orjson.OPT_NON_STR_KEYS).decode()
     
     def get_chain(self):
         """
@@ -1,14 +1,20 @@
+import itertools
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 import torch
-import torchaudio
 from huggingface_hub import hf_hub_download
 from .models import Model
 from moshi.models import loaders
 from tokenizers.processors import TemplateProcessing
 from transformers import AutoTokenizer
-from .watermarking import CSM_1B_GH_WATERMARK, load_watermarker, watermark
+from .watermarking import CSM_1B_GH_WATERMARK, load_watermarker, resample, watermark, watermark_batch
+
+
+# Streamed audio is watermarked in windows padded with this much audio on each
+# side, and neighbouring windows are crossfaded over STREAM_WATERMARK_FADE_MS
+STREAM_WATERMARK_CONTEXT_MS = 300
+STREAM_WATERMARK_FADE_MS = 20
 
 
 @dataclass
@@ -105,16 +111,16 @@ class Generator:
 
         return torch.cat([text_tokens, audio_tokens], dim=0), torch.cat([text_masks, audio_masks], dim=0)
 
-    @torch.inference_mode()
-    def generate(
+    def _generate_frames(
         self,
         text: str,
         speaker: int,
         context: List[Segment],
-        max_audio_length_ms: float = 90_000,
-        temperature: float = 0.9,
-        topk: int = 50,
-    ) -> torch.Tensor:
+        max_audio_length_ms: float,
+        temperature: float,
+        topk: int,
+    ) -> Iterator[torch.Tensor]:
+        """Yield codec frames of shape (1, 32) until EOS or the length limit."""
         self._model.reset_caches()
 
         max_generation_len = int(max_audio_length_ms / 80)
@@ -131,7 +137,6 @@ class Generator:
         prompt_tokens = torch.cat(tokens, dim=0).long().to(self.device)
         prompt_tokens_mask = torch.cat(tokens_mask, dim=0).bool().to(self.device)
 
-        samples = []
         curr_tokens = prompt_tokens.unsqueeze(0)
         curr_tokens_mask = prompt_tokens_mask.unsqueeze(0)
         curr_pos = torch.arange(0, prompt_tokens.size(0)).unsqueeze(0).long().to(self.device)
@@ -143,29 +148,150 @@ class Generator:
                 f"Inputs too long, must be below max_seq_len - max_generation_len: {max_context_len}"
             )
 
+        # Every step after the prompt has the same shape: allocate the constant
+        # parts once on the device instead of copying them over per frame.
+        zero_token = torch.zeros(1, 1, dtype=torch.long, device=self.device)
+        step_mask = torch.cat(
+            [
+                torch.ones(1, self._model.config.audio_num_codebooks, dtype=torch.bool, device=self.device),
+                torch.zeros(1, 1, dtype=torch.bool, device=self.device),
+            ],
+            dim=1,
+        ).unsqueeze(1)
+
         for _ in range(max_generation_len):
             sample = self._model.generate_frame(curr_tokens, curr_tokens_mask, curr_pos, temperature, topk)
             if torch.all(sample == 0):
                 break  # eos
 
-            samples.append(sample)
+            yield sample
 
-            curr_tokens = torch.cat([sample, torch.zeros(1, 1).long().to(self.device)], dim=1).unsqueeze(1)
-            curr_tokens_mask = torch.cat(
-                [torch.ones_like(sample).bool(), torch.zeros(1, 1).bool().to(self.device)], dim=1
-            ).unsqueeze(1)
+            curr_tokens = torch.cat([sample, zero_token], dim=1).unsqueeze(1)
+            curr_tokens_mask = step_mask
             curr_pos = curr_pos[:, -1:] + 1
 
-        audio = self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
-
+    def _watermark(self, audio: torch.Tensor) -> torch.Tensor:
         # This applies an imperceptible watermark to identify audio as AI-generated.
         # Watermarking ensures transparency, dissuades misuse, and enables traceability.
         # Please be a responsible AI citizen and keep the watermarking in place.
         # If using CSM 1B in another application, use your own private key and keep it secret.
         audio, wm_sample_rate = watermark(self._watermarker, audio, self.sample_rate, CSM_1B_GH_WATERMARK)
-        audio = torchaudio.functional.resample(audio, orig_freq=wm_sample_rate, new_freq=self.sample_rate)
+        return resample(audio, wm_sample_rate, self.sample_rate)
+
+    @torch.inference_mode()
+    def generate(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+    ) -> torch.Tensor:
+        audio = self._generate_unwatermarked(text, speaker, context, max_audio_length_ms, temperature, topk)
+
+        return self._watermark(audio)
 
-        return audio
+    def _generate_unwatermarked(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float,
+        temperature: float,
+        topk: int,
+    ) -> torch.Tensor:
+        samples = list(
+            self._generate_frames(text, speaker, context, max_audio_length_ms, temperature, topk)
+        )
+
+        return self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
+
+    @torch.inference_mode()
+    def generate_batch(self, requests: List[dict]) -> List[torch.Tensor]:
+        """
+        Generate audio for several requests, each a dict of all generate()
+        keyword arguments, and watermark the results in one batched pass.
+        """
+        audios = [self._generate_unwatermarked(**request) for request in requests]
+
+        # Same watermark as generate(); see _watermark.
+        watermarked = watermark_batch(
+            self._watermarker, audios, [self.sample_rate] * len(audios), CSM_1B_GH_WATERMARK
+        )
+        return [resample(audio, wm_sample_rate, self.sample_rate) for audio, wm_sample_rate in watermarked]
+
+    @torch.inference_mode()
+    def generate_stream(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+        frames_per_chunk: int = 25,
+    ) -> Iterator[torch.Tensor]:
+        """
+        Like generate(), but yields watermarked audio as it is produced.
+
+        Frames are decoded incrementally with Mimi's streaming decoder and
+        emitted every `frames_per_chunk` frames (80 ms each).
+        """
+        def raw_chunks() -> Iterator[torch.Tensor]:
+            pending = []
+            with self._audio_tokenizer.streaming(1):
+                for sample in self._generate_frames(text, speaker, context, max_audio_length_ms, temperature, topk):
+                    pending.append(self._audio_tokenizer.decode(sample.unsqueeze(-1)).squeeze(0).squeeze(0))
+                    if len(pending) >= frames_per_chunk:
+                        yield torch.cat(pending)
+                        pending = []
+
+            if pending:
+                yield torch.cat(pending)
+
+        yield from self._watermark_stream(raw_chunks())
+
+    def _watermark_stream(self, chunks: Iterator[torch.Tensor]) -> Iterator[torch.Tensor]:
+        """
+        Watermark audio chunks so the stream matches a single _watermark() pass.
+
+        Each window is encoded with STREAM_WATERMARK_CONTEXT_MS of real audio on
+        both sides of the part it emits, keeping resampler and encoder edge
+        effects out of the output, and consecutive windows are crossfaded over
+        STREAM_WATERMARK_FADE_MS where one encoding hands over to the next.
+        """
+        margin = int(self.sample_rate * STREAM_WATERMARK_CONTEXT_MS / 1000)
+        fade = int(self.sample_rate * STREAM_WATERMARK_FADE_MS / 1000)
+        left = None  # already-sent raw audio, leading context for the next window
+        unsent = None  # raw audio not yet emitted
+        fade_from = None  # previous window's encoding of the start of `unsent`
+
+        for chunk in itertools.chain(chunks, [None]):
+            final = chunk is None
+            if not final:
+                unsent = chunk if unsent is None else torch.cat([unsent, chunk])
+                # The last `margin` samples are only trailing context until more audio arrives
+                if unsent.shape[-1] <= margin:
+                    continue
+            elif unsent is None:
+                return
+
+            window = unsent if left is None else torch.cat([left, unsent])
+            start = window.shape[-1] - unsent.shape[-1]
+            stop = window.shape[-1] if final else window.shape[-1] - margin
+            encoded = self._watermark(window)
+
+            out = encoded[start:stop]
+            if fade_from is not None:
+                n = min(fade_from.shape[-1], out.shape[-1])
+                ramp = torch.linspace(0, 1, n, device=out.device, dtype=out.dtype)
+                out = torch.cat([fade_from[:n] * (1 - ramp) + out[:n] * ramp, out[n:]])
+            yield out
+
+            fade_from = encoded[stop:stop + fade]
+            left = window[max(0, stop - margin):stop]
+            unsent = window[stop:]
 
 
 def load_csm_1b(device: str = "cuda") -> Generator:
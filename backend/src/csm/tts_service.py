@@ -6,14 +6,289 @@ It handles model loading, caching, and audio generation for reading notebook res
 """
 import os
 import io
+import re
+import struct
+import asyncio
+import hashlib
+import threading
 import torch
 import torchaudio
-from typing import Optional
+from typing import Callable, Iterator, List, Optional
 from dataclasses import dataclass
+from pathlib import Path
 from huggingface_hub import hf_hub_download
 
-# Disable Triton compilation for compatibility
-os.environ["NO_TORCH_COMPILE"] = "1"
+try:
+    # google-re2 is a linear-time DFA engine, immune to backtracking blowups
+    # on unterminated code fences and emphasis markers. Optional.
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# Disable Triton compilation for compatibility (set NO_TORCH_COMPILE=0 to opt in)
+os.environ.setdefault("NO_TORCH_COMPILE", "1")
+
+
+def _list_item_to_sentence(content: str) -> str:
+    """Turn a bullet or numbered list item into a sentence."""
+    content = content.strip()
+    # Add period if not already ending with punctuation
+    if content and content[-1] not in '.!?,:;':
+        content += '.'
+    return content + ' '
+
+
+# Inline markdown stripped by TTSService._clean_text_for_tts in a single pass.
+# Alternatives are tried left to right, so code wins over emphasis and images
+# win over links.
+_RE_INLINE = _re_engine.compile(
+    r'(?P<code_block>```[\s\S]*?```)'
+    r'|(?P<inline_code>`[^`]*`)'
+    r'|(?P<image>!\[[^\]]*\]\([^)]+\))'
+    r'|\[(?P<link>[^\]]+)\]\([^)]+\)'
+    r'|(?P<citation>\[\d+\])'
+    r'|(?P<url>https?://\S+)'
+    r'|\*\*\*(?P<bold_italic>[^*]+)\*\*\*'
+    r'|\*\*(?P<bold>[^*]+)\*\*'
+    r'|__(?P<bold_u>[^_]+)__'
+    r'|~~(?P<strike>[^~]+)~~'
+    r'|\*(?P<italic>[^*]+)\*'
+    r'|_(?P<italic_u>[^_]+)_'
+)
+
+# Line-level markdown (headers, rules, quotes, lists), also in a single pass
+_RE_LINE = _re_engine.compile(
+    r'(?m)^(?:(?P<rule>[-*_]{3,}\s*$)'
+    r'|#+\s*(?P<header>.*)$'
+    r'|>\s*(?P<quote>.*)$'
+    r'|\s*[-*+]\s+(?P<bullet>.+)$'
+    r'|\s*\d+\.\s+(?P<numbered>.+)$)'
+)
+
+_RE_WHITESPACE = re.compile(r'[ \t\n]+')
+_RE_MULTI_PERIOD = re.compile(r'\.{2,}')
+
+
+def _strip_inline(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind in ('link', 'bold_italic', 'bold', 'bold_u', 'strike', 'italic', 'italic_u'):
+        # Keep the content, cleaning any markup nested inside it
+        return _RE_INLINE.sub(_strip_inline, match.group(kind))
+    return ''
+
+
+def _strip_line(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == 'header':
+        return match.group(kind) + '.'  # Add period after headers
+    if kind == 'quote':
+        # Blockquotes become regular lines, which may themselves be list items
+        return _RE_LINE.sub(_strip_line, match.group(kind))
+    if kind in ('bullet', 'numbered'):
+        return _list_item_to_sentence(match.group(kind))
+    return ''
+
+
+def _wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """Build a WAV header for a stream of unknown length."""
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack(
+            "<IHHIIHH", 16, 1, channels, sample_rate,
+            sample_rate * block_align, block_align, bits_per_sample
+        )
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def _to_pcm16(audio: torch.Tensor) -> bytes:
+    """Convert a float audio tensor in [-1, 1] to little-endian 16-bit PCM."""
+    pcm = (audio.float().clamp(-1.0, 1.0) * 32767).to(torch.int16).cpu()
+    return pcm.numpy().astype("<i2", copy=False).tobytes()
+
+
+def clean_text_for_tts(text: str, style: str = "reading") -> str:
+    """
+    Clean and prepare text for TTS.
+    
+    For 'reading' style: Text is cleaned and prepared for accurate reading.
+    For 'conversational' style: Text is more casually formatted.
+    
+    Args:
+        text: Raw text that may contain markdown
+        style: 'reading' or 'conversational'
+    
+    Returns:
+        Clean text suitable for TTS
+    """
+    # Remove code, links, images, citations, URLs and emphasis (keeping the text)
+    text = _RE_INLINE.sub(_strip_inline, text)
+    
+    # Remove headers, horizontal rules and blockquote markers, and
+    # convert list items to sentences with proper punctuation
+    text = _RE_LINE.sub(_strip_line, text)
+    
+    # Normalize newlines and whitespace (TTS reads continuously)
+    text = _RE_WHITESPACE.sub(' ', text)
+    text = text.strip()
+    
+    # Ensure proper sentence endings for natural pacing
+    # Add periods after incomplete sentences
+    sentences = text.split('. ')
+    cleaned_sentences = []
+    for s in sentences:
+        s = s.strip()
+        if s:
+            # Ensure sentence ends with punctuation
+            if s[-1] not in '.!?':
+                s += '.'
+            cleaned_sentences.append(s)
+    text = ' '.join(cleaned_sentences)
+    
+    # Replace multiple periods with single
+    text = _RE_MULTI_PERIOD.sub('.', text)
+    
+    # Limit length (CSM has context limits)
+    max_chars = 2000  # Reasonable limit for TTS
+    if len(text) > max_chars:
+        # Try to cut at sentence boundary
+        truncated = text[:max_chars]
+        last_period = truncated.rfind('.')
+        if last_period > max_chars * 0.7:
+            text = truncated[:last_period + 1]
+        else:
+            text = truncated + "."
+    
+    return text
+
+
+def encode_wav(audio: torch.Tensor, sample_rate: int) -> bytes:
+    """Encode a CPU audio tensor as WAV bytes."""
+    wav_buffer = io.BytesIO()
+    torchaudio.save(wav_buffer, audio.unsqueeze(0), sample_rate, format="wav")
+    return wav_buffer.getvalue()
+
+
+# Voice prompts, stored already resampled to the model's sample rate
+TTS_PROMPT_CACHE_DIR = Path(os.getenv(
+    "TTS_PROMPT_CACHE_DIR",
+    Path(__file__).resolve().parents[2] / "data" / "tts_prompts",
+))
+
+# Content-addressed cache of generated WAVs
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "/tmp/obook_tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+
+def _wav_cache_key(clean_text: str, config: "TTSConfig") -> str:
+    style = getattr(config, 'style', 'reading')
+    raw = f"{clean_text}|{config.speaker}|{config.temperature}|{config.topk}|{style}|{config.max_audio_length_ms}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _read_cached_wav(key: str) -> Optional[bytes]:
+    """Return cached WAV bytes for a key, or None on a miss."""
+    path = TTS_CACHE_DIR / f"{key}.wav"
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    # Touch the file so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def _write_cached_wav(key: str, wav_bytes: bytes):
+    """Atomically store WAV bytes, then evict least recently used entries over the size limit."""
+    try:
+        TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = TTS_CACHE_DIR / f"{key}.{os.getpid()}.tmp"
+        tmp_path.write_bytes(wav_bytes)
+        os.replace(tmp_path, TTS_CACHE_DIR / f"{key}.wav")
+        _evict_wav_cache()
+    except OSError as e:
+        print(f"Warning: failed to cache TTS audio: {e}")
+
+
+def _evict_wav_cache():
+    entries = []
+    total = 0
+    with os.scandir(TTS_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".wav"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    
+    entries.sort()
+    for _, size, path in entries:
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class TTSBatcher:
+    """
+    Collects TTS requests arriving within a short window and runs them as one
+    GPU job, so concurrent users share a single model pass instead of
+    contending for it.
+    """
+    
+    def __init__(
+        self,
+        generate_batch: Callable[[List[tuple]], List[torch.Tensor]],
+        max_batch_size: int = 4,
+        max_wait_ms: float = 20,
+    ):
+        self._generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def submit(self, clean_text: str, config: "TTSConfig") -> torch.Tensor:
+        """Queue one request and wait for its audio."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._batch_worker())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((clean_text, config, future))
+        return await future
+    
+    async def _batch_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            requests = [(text, config) for text, config, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self._generate_batch, requests)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, _, future), audio in zip(batch, results):
+                if not future.done():
+                    future.set_result(audio)
 
 
 @dataclass
@@ -70,6 +345,11 @@ class TTSService:
     _device = None
     _enabled = True
     _initialization_error = None
+    _batcher: Optional[TTSBatcher] = None
+    # The generator's KV caches and Mimi streaming state are single-use; every
+    # model entry point (batched, single, streaming) holds this lock
+    _generation_lock = threading.Lock()
+    _load_lock = threading.Lock()
     
     def __new__(cls):
         """Singleton pattern to avoid loading model multiple times."""
@@ -100,6 +380,12 @@ class TTSService:
         if self._generator is not None:
             return
         
+        with self._load_lock:
+            if self._generator is None:
+                self._load_model_locked()
+    
+    def _load_model_locked(self):
+        """Build the generator; only called with _load_lock held."""
         try:
             from .generator import load_csm_1b, Segment
             
@@ -111,11 +397,18 @@ class TTSService:
                 print("Warning: Running CSM on CPU. This will be slow.")
             
             print(f"Loading CSM-1B TTS model on {self._device}...")
-            self._generator = load_csm_1b(self._device)
+            generator = load_csm_1b(self._device)
+            compiled = self._optimize_model(generator)
             print("CSM-1B model loaded successfully.")
             
             # Load voice prompts
-            self._load_prompts()
+            self._load_prompts(generator)
+            
+            if compiled:
+                self._warmup(generator)
+            
+            # Published last: callers treat a set _generator as fully loaded
+            self._generator = generator
             
         except Exception as e:
             self._enabled = False
@@ -123,20 +416,66 @@ class TTSService:
             print(f"Failed to load TTS model: {e}")
             raise
     
-    def _load_prompts(self):
+    def _optimize_model(self, generator) -> bool:
+        """
+        Apply inference optimizations to the loaded model.
+        
+        Weights are already bf16 (see load_csm_1b). TF32 matmuls are enabled on
+        CUDA; int8 weight-only quantization (TTS_QUANTIZE=int8) and torch.compile
+        (NO_TORCH_COMPILE=0) are opt-in since they depend on GPU/torch support.
+        
+        Returns:
+            True if the model was compiled and needs a warmup pass.
+        """
+        model = generator._model
+        
+        if self._device == "cuda":
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+        
+        if os.getenv("TTS_QUANTIZE", "").lower() == "int8":
+            try:
+                from torchao.quantization import quantize_, int8_weight_only
+                quantize_(model, int8_weight_only())
+                print("Quantized CSM-1B linear layers to int8.")
+            except Exception as e:
+                print(f"Warning: int8 quantization failed, using bf16 weights: {e}")
+        
+        if self._device == "cuda" and os.environ.get("NO_TORCH_COMPILE") != "1":
+            # Backbone and decoder run once per frame / per codebook; compiling
+            # them removes per-op dispatch overhead in the decode loop.
+            model.backbone = torch.compile(model.backbone, mode="reduce-overhead", fullgraph=False)
+            model.decoder = torch.compile(model.decoder, mode="reduce-overhead", fullgraph=False)
+            print("Compiled CSM-1B backbone and decoder with torch.compile.")
+            return True
+        
+        return False
+    
+    def _warmup(self, generator):
+        """
+        Run a short generation so compilation and CUDA graph capture happen at
+        load time rather than on the first user request.
+        
+        reduce-overhead mode records the fixed-shape per-frame decode steps as
+        CUDA graphs and replays them afterwards; the variable-length prompt
+        prefill stays eager.
+        """
+        try:
+            with torch.inference_mode():
+                generator.generate(
+                    text="Warming up.",
+                    speaker=0,
+                    context=[self._prompts["conversational_a"]],
+                    max_audio_length_ms=2_000,
+                )
+            print("CSM-1B warmup complete.")
+        except Exception as e:
+            print(f"Warning: TTS warmup failed: {e}")
+    
+    def _load_prompts(self, generator):
         """Load the voice prompt audio files."""
         from .generator import Segment
         
-        # Download prompts from HuggingFace
-        prompt_a_path = hf_hub_download(
-            repo_id="sesame/csm-1b",
-            filename="prompts/conversational_a.wav"
-        )
-        prompt_b_path = hf_hub_download(
-            repo_id="sesame/csm-1b",
-            filename="prompts/conversational_b.wav"
-        )
-        
         # Prompt transcripts for context
         prompt_texts = {
             "conversational_a": (
@@ -157,26 +496,57 @@ class TTSService:
             )
         }
         
-        def load_audio(path: str) -> torch.Tensor:
-            audio_tensor, sample_rate = torchaudio.load(path)
+        sample_rate = generator.sample_rate
+        
+        def load_audio(name: str) -> torch.Tensor:
+            # Prompts are static, so keep them on disk already resampled
+            cache_path = TTS_PROMPT_CACHE_DIR / f"{name}_{sample_rate}.pt"
+            if cache_path.exists():
+                try:
+                    return torch.load(cache_path, mmap=True, weights_only=True)
+                except Exception as e:
+                    print(f"Warning: ignoring unreadable prompt cache {cache_path}: {e}")
+            
+            # Download prompt from HuggingFace
+            path = hf_hub_download(
+                repo_id="sesame/csm-1b",
+                filename=f"prompts/{name}.wav"
+            )
+            audio_tensor, orig_freq = torchaudio.load(path)
             audio_tensor = audio_tensor.squeeze(0)
             audio_tensor = torchaudio.functional.resample(
                 audio_tensor, 
-                orig_freq=sample_rate, 
-                new_freq=self._generator.sample_rate
+                orig_freq=orig_freq, 
+                new_freq=sample_rate
             )
+            
+            try:
+                TTS_PROMPT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                torch.save(audio_tensor, tmp_path)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"Warning: failed to cache voice prompt {name}: {e}")
+            return audio_tensor
+        
+        def load_prompt_audio(name: str) -> torch.Tensor:
+            # Keep prompts resident on the model's device so each generation
+            # doesn't copy them over again when tokenizing the context
+            audio_tensor = load_audio(name)
+            if self._device == "cuda":
+                audio_tensor = audio_tensor.pin_memory().to(self._device, non_blocking=True)
             return audio_tensor
         
         self._prompts = {
             "conversational_a": Segment(
                 speaker=0,
                 text=prompt_texts["conversational_a"],
-                audio=load_audio(prompt_a_path)
+                audio=load_prompt_audio("conversational_a")
             ),
             "conversational_b": Segment(
                 speaker=1,
                 text=prompt_texts["conversational_b"],
-                audio=load_audio(prompt_b_path)
+                audio=load_prompt_audio("conversational_b")
             )
         }
     
@@ -198,22 +568,82 @@ class TTSService:
         if config is None:
             config = TTSConfig()
         
+        # Clean text for TTS (remove markdown, etc.)
+        style = getattr(config, 'style', 'reading')
+        clean_text = self._clean_text_for_tts(text, style=style)
+        
+        # Replays of the same answer are served from disk without touching the model
+        key = _wav_cache_key(clean_text, config)
+        cached = _read_cached_wav(key)
+        if cached is not None:
+            return cached, self.get_sample_rate()
+        
         # Ensure model is loaded
         self._load_model()
         
+        audio_tensor = self._generate_audio(clean_text, config)
+        
+        # Convert to WAV bytes
+        wav_bytes = encode_wav(audio_tensor.cpu(), self._generator.sample_rate)
+        _write_cached_wav(key, wav_bytes)
+        return wav_bytes, self._generator.sample_rate
+    
+    async def agenerate_speech(
+        self,
+        text: str,
+        config: Optional[TTSConfig] = None
+    ) -> tuple[bytes, int]:
+        """
+        Async variant of generate_speech for use from request handlers.
+        
+        Text cleaning is cheap and runs inline; generation and WAV encoding run
+        in threads, so the event loop is never blocked.
+        
+        Returns:
+            Tuple of (wav_bytes, sample_rate)
+        """
+        if config is None:
+            config = TTSConfig()
+        
+        loop = asyncio.get_running_loop()
+        
+        style = getattr(config, 'style', 'reading')
+        clean_text = clean_text_for_tts(text, style)
+        
+        key = _wav_cache_key(clean_text, config)
+        cached = await loop.run_in_executor(None, _read_cached_wav, key)
+        if cached is not None:
+            return cached, self.get_sample_rate()
+        
+        # Ensure model is loaded
+        await loop.run_in_executor(None, self._load_model)
+        
+        # Concurrent requests are batched into a single GPU job
+        if self._batcher is None:
+            self._batcher = TTSBatcher(
+                self._generate_batch,
+                max_batch_size=int(os.getenv("TTS_BATCH_SIZE", 4)),
+                max_wait_ms=float(os.getenv("TTS_BATCH_WAIT_MS", 20)),
+            )
+        audio_tensor = await self._batcher.submit(clean_text, config)
+        
+        sample_rate = self._generator.sample_rate
+        wav_bytes = await asyncio.to_thread(encode_wav, audio_tensor.cpu(), sample_rate)
+        await loop.run_in_executor(None, _write_cached_wav, key, wav_bytes)
+        
+        return wav_bytes, sample_rate
+    
+    def _generation_args(self, clean_text: str, config: TTSConfig) -> dict:
+        """Build generator keyword arguments for already-cleaned text."""
         # Get the voice prompt
         prompt = self._prompts.get(config.speaker, self._prompts["conversational_a"])
         speaker_id = 0 if config.speaker == "conversational_a" else 1
         
-        # Clean text for TTS (remove markdown, etc.)
         style = getattr(config, 'style', 'reading')
-        clean_text = self._clean_text_for_tts(text, style=style)
-        
-        # Generate audio with tuned parameters
         print(f"Generating TTS ({style} mode, temp={config.temperature}, topk={config.topk})")
         print(f"Text: {clean_text[:100]}..." if len(clean_text) > 100 else f"Text: {clean_text}")
         
-        audio_tensor = self._generator.generate(
+        return dict(
             text=clean_text,
             speaker=speaker_id,
             context=[prompt],
@@ -221,119 +651,78 @@ class TTSService:
             temperature=config.temperature,
             topk=config.topk,
         )
+    
+    def _generate_audio(self, clean_text: str, config: TTSConfig) -> torch.Tensor:
+        """Run the model on already-cleaned text."""
+        # Generate audio with tuned parameters
+        with self._generation_lock:
+            return self._generator.generate(**self._generation_args(clean_text, config))
+    
+    def _generate_batch(self, requests: List[tuple]) -> List[torch.Tensor]:
+        """
+        Generate audio for several (clean_text, config) requests in one job.
         
-        # Convert to WAV bytes
-        wav_buffer = io.BytesIO()
-        torchaudio.save(
-            wav_buffer, 
-            audio_tensor.unsqueeze(0).cpu(), 
-            self._generator.sample_rate,
-            format="wav"
-        )
-        wav_buffer.seek(0)
-        
-        return wav_buffer.read(), self._generator.sample_rate
+        The generator has no batched decoding path (its KV caches are sized for
+        batch 1), so requests decode back to back and share one watermarking pass.
+        """
+        if len(requests) == 1:
+            return [self._generate_audio(*requests[0])]
+        with self._generation_lock:
+            return self._generator.generate_batch(
+                [self._generation_args(clean_text, config) for clean_text, config in requests]
+            )
     
-    def _clean_text_for_tts(self, text: str, style: str = "reading") -> str:
+    def stream_speech(
+        self,
+        text: str,
+        config: Optional[TTSConfig] = None
+    ) -> Iterator[bytes]:
         """
-        Clean and prepare text for TTS.
+        Generate speech audio from text, yielding a WAV stream as it is produced.
         
-        For 'reading' style: Text is cleaned and prepared for accurate reading.
-        For 'conversational' style: Text is more casually formatted.
+        The first chunk is a WAV header with unknown (0xFFFFFFFF) sizes, followed
+        by 16-bit mono PCM chunks, so playback can start before generation ends.
         
         Args:
-            text: Raw text that may contain markdown
-            style: 'reading' or 'conversational'
+            text: The text to convert to speech
+            config: TTS configuration options
         
-        Returns:
-            Clean text suitable for TTS
+        Yields:
+            WAV header bytes, then PCM bytes
         """
-        import re
-        
-        # Remove code blocks completely
-        text = re.sub(r'```[\s\S]*?```', '', text)
-        text = re.sub(r'`[^`]*`', '', text)
-        
-        # Remove markdown formatting but keep content
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Bold
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)  # Italic
-        text = re.sub(r'__([^_]+)__', r'\1', text)  # Bold
-        text = re.sub(r'_([^_]+)_', r'\1', text)  # Italic
-        text = re.sub(r'~~([^~]+)~~', r'\1', text)  # Strikethrough
-        
-        # Remove headers but keep text
-        text = re.sub(r'^#+\s*(.*)$', r'\1.', text, flags=re.MULTILINE)  # Add period after headers
-        
-        # Remove links but keep text
-        text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
-        
-        # Remove images
-        text = re.sub(r'!\[([^\]]*)\]\([^)]+\)', '', text)
-        
-        # Remove horizontal rules
-        text = re.sub(r'^[-*_]{3,}\s*$', '', text, flags=re.MULTILINE)
-        
-        # Convert blockquotes to regular text
-        text = re.sub(r'^>\s*', '', text, flags=re.MULTILINE)
-        
-        # Convert bullet points to sentences with proper punctuation
-        def bullet_to_sentence(match):
-            content = match.group(1).strip()
-            # Add period if not already ending with punctuation
-            if content and content[-1] not in '.!?,:;':
-                content += '.'
-            return content + ' '
-        text = re.sub(r'^\s*[-*+]\s+(.+)$', bullet_to_sentence, text, flags=re.MULTILINE)
-        
-        # Convert numbered lists to sentences
-        def numbered_to_sentence(match):
-            content = match.group(1).strip()
-            if content and content[-1] not in '.!?,:;':
-                content += '.'
-            return content + ' '
-        text = re.sub(r'^\s*\d+\.\s+(.+)$', numbered_to_sentence, text, flags=re.MULTILINE)
-        
-        # Remove citation markers like [1], [2], etc.
-        text = re.sub(r'\[\d+\]', '', text)
-        
-        # Clean up URLs
-        text = re.sub(r'https?://\S+', '', text)
-        
-        # Normalize newlines to spaces (TTS reads continuously)
-        text = re.sub(r'\n+', ' ', text)
-        
-        # Normalize whitespace
-        text = re.sub(r'[ \t]+', ' ', text)
-        text = text.strip()
-        
-        # Ensure proper sentence endings for natural pacing
-        # Add periods after incomplete sentences
-        sentences = text.split('. ')
-        cleaned_sentences = []
-        for s in sentences:
-            s = s.strip()
-            if s:
-                # Ensure sentence ends with punctuation
-                if s[-1] not in '.!?':
-                    s += '.'
-                cleaned_sentences.append(s)
-        text = ' '.join(cleaned_sentences)
-        
-        # Replace multiple periods with single
-        text = re.sub(r'\.{2,}', '.', text)
-        
-        # Limit length (CSM has context limits)
-        max_chars = 2000  # Reasonable limit for TTS
-        if len(text) > max_chars:
-            # Try to cut at sentence boundary
-            truncated = text[:max_chars]
-            last_period = truncated.rfind('.')
-            if last_period > max_chars * 0.7:
-                text = truncated[:last_period + 1]
-            else:
-                text = truncated + "."
+        if config is None:
+            config = TTSConfig()
+        
+        # Ensure model is loaded
+        self._load_model()
         
-        return text
+        prompt = self._prompts.get(config.speaker, self._prompts["conversational_a"])
+        speaker_id = 0 if config.speaker == "conversational_a" else 1
+        
+        style = getattr(config, 'style', 'reading')
+        clean_text = self._clean_text_for_tts(text, style=style)
+        
+        print(f"Streaming TTS ({style} mode, temp={config.temperature}, topk={config.topk})")
+        
+        yield _wav_stream_header(self._generator.sample_rate)
+        
+        # Held for the whole stream: Starlette may resume this iterator on a different
+        # threadpool thread per chunk, which a plain Lock (unlike RLock) allows.
+        # Closing the generator on disconnect releases it.
+        with self._generation_lock:
+            for audio_chunk in self._generator.generate_stream(
+                text=clean_text,
+                speaker=speaker_id,
+                context=[prompt],
+                max_audio_length_ms=config.max_audio_length_ms,
+                temperature=config.temperature,
+                topk=config.topk,
+            ):
+                yield _to_pcm16(audio_chunk)
+    
+    def _clean_text_for_tts(self, text: str, style: str = "reading") -> str:
+        """Clean and prepare text for TTS. See clean_text_for_tts."""
+        return clean_text_for_tts(text, style=style)
     
     def get_sample_rate(self) -> int:
         """Get the audio sample rate."""
@@ -2,13 +2,63 @@
 Watermarking module for CSM TTS
 This module handles adding imperceptible watermarks to AI-generated audio.
 """
+import contextlib
+import math
+import os
+from typing import Optional
+
 import torch
 import torchaudio
+from torch.nn.utils.rnn import pad_sequence
 
 # Public watermark key for CSM 1B (not secure, for identification purposes)
 # If using in production, generate your own private key and keep it secret
 CSM_1B_GH_WATERMARK = [212, 211, 146, 56, 201]
 
+# Resample modules keyed by (orig_freq, new_freq, device, dtype); each holds a
+# precomputed polyphase kernel, so it is built once rather than on every call.
+_RESAMPLER_CACHE: dict[tuple, torchaudio.transforms.Resample] = {}
+
+
+def _get_resampler(orig_freq: int, new_freq: int, device: torch.device, dtype: torch.dtype) -> torchaudio.transforms.Resample:
+    """Return a cached Resample module for the given rates, device and dtype."""
+    key = (orig_freq, new_freq, str(device), dtype)
+    resampler = _RESAMPLER_CACHE.get(key)
+    if resampler is None:
+        resampler = torchaudio.transforms.Resample(orig_freq, new_freq, dtype=dtype).to(device)
+        _RESAMPLER_CACHE[key] = resampler
+    return resampler
+
+
+# Reduced-precision autocast for the watermarker (WATERMARK_AUTOCAST=bf16|fp16).
+# Off by default: the watermark sits ~36 dB below the signal, close to bf16's
+# own quantization noise, so enable only after checking verify() still passes.
+_AUTOCAST_DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def _autocast(device: torch.device):
+    dtype = _AUTOCAST_DTYPES.get(os.getenv("WATERMARK_AUTOCAST", "").lower())
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=dtype)
+
+
+def _encode(watermarker, audio_44khz: torch.Tensor, watermark_key: list[int]) -> torch.Tensor:
+    with _autocast(audio_44khz.device):
+        encoded, _ = watermarker.encode_wav(audio_44khz, 44100, watermark_key, calc_sdr=False, message_sdr=36)
+    # Keep the float32 contract for the rest of the audio pipeline
+    return encoded.float() if isinstance(encoded, torch.Tensor) else encoded
+
+
+def resample(audio: torch.Tensor, orig_freq: int, new_freq: int) -> torch.Tensor:
+    """Resample through the cached kernels, passing audio through untouched when the rates match."""
+    if orig_freq == new_freq:
+        return audio
+    resampler = _get_resampler(orig_freq, new_freq, audio.device, audio.dtype)
+    # The cached module already lives on the input's device; no .to() on either side
+    assert resampler.kernel.device == audio.device, "resampler kernel on the wrong device"
+    return resampler(audio)
+
 
 def load_watermarker(device: str = "cuda"):
     """
@@ -26,6 +76,22 @@ def load_watermarker(device: str = "cuda"):
             model_type="44.1k",
             device=device,
         )
+        # Inference only: no dropout/batch-norm updates, no grad bookkeeping.
+        # silentcipher's Model is a plain class holding its encoder and decoders
+        # as nn.Module attributes, so freeze those rather than the wrapper.
+        for module in vars(model).values():
+            if isinstance(module, torch.nn.Module):
+                module.eval()
+                module.requires_grad_(False)
+        
+        # Follows the TTS model's opt-in (NO_TORCH_COMPILE=0); audio lengths vary
+        # per request, so compile with dynamic shapes to avoid a recompile each call.
+        if str(device).startswith("cuda") and os.environ.get("NO_TORCH_COMPILE") != "1":
+            try:
+                model.encode_wav = torch.compile(model.encode_wav, mode="reduce-overhead", dynamic=True, fullgraph=False)
+                model.decode_wav = torch.compile(model.decode_wav, mode="reduce-overhead", dynamic=True, fullgraph=False)
+            except Exception as e:
+                print(f"Warning: failed to compile watermarker, running eagerly: {e}")
         return model
     except ImportError:
         print("Warning: silentcipher not installed. Watermarking will be disabled.")
@@ -58,14 +124,67 @@ def watermark(
         # Return original audio if watermarker is not available
         return audio_array, sample_rate
     
-    audio_array_44khz = torchaudio.functional.resample(audio_array, orig_freq=sample_rate, new_freq=44100)
-    encoded, _ = watermarker.encode_wav(audio_array_44khz, 44100, watermark_key, calc_sdr=False, message_sdr=36)
+    # SilentCipher encodes at 44.1 kHz; audio at or below that rate comes back
+    # at its own rate with a single resample each way (none at 44.1 kHz)
+    audio_array_44khz = resample(audio_array, sample_rate, 44100)
+    encoded = _encode(watermarker, audio_array_44khz, watermark_key)
 
     output_sample_rate = min(44100, sample_rate)
-    encoded = torchaudio.functional.resample(encoded, orig_freq=44100, new_freq=output_sample_rate)
+    encoded = resample(encoded, 44100, output_sample_rate)
     return encoded, output_sample_rate
 
 
+@torch.inference_mode()
+def watermark_batch(
+    watermarker,
+    audios: list[torch.Tensor],
+    sample_rates: list[int],
+    watermark_key: list[int],
+) -> list[tuple[torch.Tensor, int]]:
+    """
+    Watermark several 1-D audio tensors at once.
+    
+    Audio is grouped by sample rate and padded into a (B, T) batch so each
+    resample runs once per group; SilentCipher still encodes one clip at a
+    time since encode_wav treats a 2-D input as multi-channel audio.
+    
+    Args:
+        watermarker: The watermarking model
+        audios: Audio tensors to watermark
+        sample_rates: Sample rate of each audio tensor
+        watermark_key: List of integers for the watermark
+    
+    Returns:
+        List of (watermarked_audio, output_sample_rate), in input order
+    """
+    if watermarker is None:
+        return list(zip(audios, sample_rates))
+    
+    groups: dict[int, list[int]] = {}
+    for i, sample_rate in enumerate(sample_rates):
+        groups.setdefault(sample_rate, []).append(i)
+    
+    results: list = [None] * len(audios)
+    for sample_rate, indices in groups.items():
+        batch = pad_sequence([audios[i] for i in indices], batch_first=True)
+        batch_44khz = resample(batch, sample_rate, 44100)
+        
+        encoded = []
+        for i, row in zip(indices, batch_44khz):
+            length = math.ceil(audios[i].shape[-1] * 44100 / sample_rate)
+            encoded_row = _encode(watermarker, row[:length], watermark_key)
+            encoded.append(encoded_row)
+        
+        output_sample_rate = min(44100, sample_rate)
+        encoded_batch = pad_sequence(encoded, batch_first=True)
+        resampled = resample(encoded_batch, 44100, output_sample_rate)
+        for i, row, encoded_row in zip(indices, resampled, encoded):
+            length = math.ceil(encoded_row.shape[-1] * output_sample_rate / 44100)
+            results[i] = (row[:length], output_sample_rate)
+    
+    return results
+
+
 @torch.inference_mode()
 def verify(
     watermarker,
@@ -88,8 +207,9 @@ def verify(
     if watermarker is None:
         return False
     
-    watermarked_audio_44khz = torchaudio.functional.resample(watermarked_audio, orig_freq=sample_rate, new_freq=44100)
-    result = watermarker.decode_wav(watermarked_audio_44khz, 44100, phase_shift_decoding=True)
+    watermarked_audio_44khz = resample(watermarked_audio, sample_rate, 44100)
+    with _autocast(watermarked_audio_44khz.device):
+        result = watermarker.decode_wav(watermarked_audio_44khz, 44100, phase_shift_decoding=True)
 
     is_watermarked = result["status"]
     if is_watermarked:
@@ -100,8 +220,28 @@ def verify(
     return is_watermarked and is_csm_watermarked
 
 
-def load_audio(audio_path: str) -> tuple[torch.Tensor, int]:
-    """Load audio from a file path."""
+def load_audio(audio_path: str, device: Optional[str] = None) -> tuple[torch.Tensor, int]:
+    """
+    Load audio from a file path.
+    
+    Args:
+        audio_path: Path to the audio file
+        device: Optional device to move the audio to; CUDA transfers go
+            through pinned memory and don't block the calling thread
+    
+    Returns:
+        Tuple of (mono_audio, sample_rate)
+    """
     audio_array, sample_rate = torchaudio.load(audio_path)
-    audio_array = audio_array.mean(dim=0)
+    num_channels = audio_array.shape[0]
+    if num_channels == 1:
+        audio_array = audio_array[0]
+    else:
+        # Downmix with one reduction and an in-place divide
+        audio_array = audio_array.sum(dim=0).div_(num_channels)
+    
+    if device is not None and str(device).startswith("cuda"):
+        audio_array = audio_array.pin_memory().to(device, non_blocking=True)
+    elif device is not None:
+        audio_array = audio_array.to(device)
     return audio_array, int(sample_rate)
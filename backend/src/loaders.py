@@ -3,9 +3,13 @@ Universal Document Loader.
 Automatically detects and extracts text from various file types.
 """
 
+import mmap
 import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 SUPPORTED_EXTENSIONS = {
     ".txt": "text",
@@ -66,15 +70,59 @@ SUPPORTED_EXTENSIONS = {
     ".wma": "audio",
 }
 
+# Code file extension -> fenced code block language
+_EXT_TO_LANG = {
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".jsx": "javascript",
+    ".tsx": "typescript",
+    ".java": "java",
+    ".cpp": "cpp",
+    ".c": "c",
+    ".h": "c",
+    ".rs": "rust",
+    ".go": "go",
+    ".rb": "ruby",
+    ".php": "php",
+    ".swift": "swift",
+    ".kt": "kotlin",
+    ".sql": "sql",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".css": "css",
+    ".scss": "scss",
+    ".less": "less",
+    ".vue": "vue",
+    ".svelte": "svelte",
+    ".r": "r",
+    ".scala": "scala",
+    ".lua": "lua",
+    ".perl": "perl",
+    ".pl": "perl",
+}
+
 
 def get_file_type(file_path: str) -> Optional[str]:
     """Get the file type category from extension."""
-    ext = Path(file_path).suffix.lower()
-    return SUPPORTED_EXTENSIONS.get(ext)
+    return SUPPORTED_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
+
+# Files above this size are decoded straight from a memory map
+MMAP_THRESHOLD = 1024 * 1024
 
 
 def load_text(file_path: str) -> str:
     """Load plain text file."""
+    if os.path.getsize(file_path) > MMAP_THRESHOLD:
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = str(mm, "utf-8", "ignore")
+            has_cr = mm.find(b"\r") != -1
+        # Match text-mode universal newlines
+        if has_cr:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+    
     with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
@@ -84,26 +132,114 @@ def load_markdown(file_path: str) -> str:
     return load_text(file_path)
 
 
+# Pages sampled before committing to native extraction or OCR
+PDF_SAMPLE_PAGES = 3
+
+# OCR pipeline: pages per tesseract run, concurrent runs, and batches buffered
+OCR_BATCH_PAGES = 8
+OCR_WORKERS = 2
+OCR_MAX_IN_FLIGHT = 4
+
+
+def _ocr_available() -> bool:
+    """Whether pdf2image, pytesseract and the tesseract binary are all usable."""
+    try:
+        import pdf2image  # noqa: F401
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def _ocr_pages(images: list) -> List[str]:
+    """OCR a batch of page images with one tesseract run over a multi-page TIFF."""
+    import pytesseract
+    
+    if not images:
+        return []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tiff_path = os.path.join(tmp_dir, "pages.tiff")
+        images[0].save(tiff_path, save_all=True, append_images=images[1:])
+        text = pytesseract.image_to_string(tiff_path)
+    
+    # Pages come back separated by form feeds
+    return text.split("\f")[:len(images)]
+
+
+def _ocr_pdf(file_path: str) -> str:
+    """
+    OCR a PDF, rasterizing the next batch of pages while earlier batches are
+    being recognized. At most OCR_MAX_IN_FLIGHT batches of images are held
+    in memory at once.
+    """
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    
+    num_pages = pdfinfo_from_path(file_path)["Pages"]
+    thread_count = max(1, (os.cpu_count() or 2) // 2)
+    print(f"OCR processing {num_pages} pages...")
+    
+    ocr_parts: List[str] = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=OCR_WORKERS) as pool:
+        for first_page in range(1, num_pages + 1, OCR_BATCH_PAGES):
+            last_page = min(first_page + OCR_BATCH_PAGES - 1, num_pages)
+            images = convert_from_path(
+                file_path, first_page=first_page, last_page=last_page, thread_count=thread_count
+            )
+            if len(pending) >= OCR_MAX_IN_FLIGHT:
+                ocr_parts.extend(pending.popleft().result())
+            pending.append(pool.submit(_ocr_pages, images))
+        
+        while pending:
+            ocr_parts.extend(pending.popleft().result())
+    
+    return "\n\n".join(ocr_parts)
+
+
+def rasterize_pdf(file_path: str, dpi: int = 300) -> List[bytes]:
+    """Render every page of a PDF to PNG bytes, e.g. for OCR in another process."""
+    import io
+    from pdf2image import convert_from_path
+    
+    pages = []
+    for image in convert_from_path(file_path, dpi=dpi):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        pages.append(buffer.getvalue())
+    return pages
+
+
 def load_pdf(file_path: str) -> str:
     """Load PDF file using pypdf, with OCR fallback for scanned docs."""
     from pypdf import PdfReader
     
     text_parts = []
+    looks_scanned = False
     try:
         reader = PdfReader(file_path)
-        for page in reader.pages:
+        num_pages = len(reader.pages)
+        sample_size = min(PDF_SAMPLE_PAGES, num_pages)
+        for i, page in enumerate(reader.pages):
             text = page.extract_text()
             if text:
                 text_parts.append(text)
+            
+            # Decide native vs OCR from the first few pages rather than
+            # extracting every page of a scan only to throw the text away
+            if i + 1 == sample_size and num_pages > sample_size:
+                sampled = sum(len(t.strip()) for t in text_parts)
+                if (sampled <= 100 or sampled / sample_size <= 20) and _ocr_available():
+                    looks_scanned = True
+                    break
     except Exception as e:
         print(f"Error reading PDF text natively: {e}")
 
     extracted_text = "\n\n".join(text_parts)
     
-    if len(extracted_text.strip()) < 100:
-        print(f"PDF {os.path.basename(file_path)} appears scanned (text len < 100). Attempting OCR...")
+    if looks_scanned or len(extracted_text.strip()) < 100:
+        print(f"PDF {os.path.basename(file_path)} appears scanned (little native text). Attempting OCR...")
         try:
-            from pdf2image import convert_from_path
             import pytesseract
             
             try:
@@ -112,14 +248,7 @@ def load_pdf(file_path: str) -> str:
                 print("Tesseract not installed. Skipping OCR.")
                 return extracted_text
 
-            images = convert_from_path(file_path)
-            ocr_parts = []
-            for i, img in enumerate(images):
-                print(f"OCR processing page {i+1}/{len(images)}...")
-                text = pytesseract.image_to_string(img)
-                ocr_parts.append(text)
-            
-            return "\n\n".join(ocr_parts)
+            return _ocr_pdf(file_path)
             
         except ImportError:
             print("pdf2image or pytesseract missing. Install them for OCR support.")
@@ -142,27 +271,55 @@ def load_docx(file_path: str) -> str:
 
 def load_json(file_path: str) -> str:
     """Load JSON file and convert to readable text."""
-    import json
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(file_path, "rb") as f:
+        raw = f.read()
     
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    
+    if orjson is not None:
+        try:
+            return orjson.dumps(orjson.loads(raw), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        except (orjson.JSONDecodeError, orjson.JSONEncodeError):
+            # NaN, integers over 64 bits, etc.: let the stdlib handle it
+            pass
+    
+    import json
+    data = json.loads(raw)
     return json.dumps(data, indent=2, ensure_ascii=False)
 
 
+def _dataframe_to_markdown(df) -> str:
+    """Render a DataFrame as a markdown table, building rows column by column."""
+    columns = [str(c) for c in df.columns]
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "| " + " | ".join(["---"] * len(columns)) + " |",
+    ]
+    
+    if len(columns) and len(df):
+        # Missing values render as "nan", as str() gives
+        cells = df.astype(object).fillna("nan").astype(str)
+        rows = "| " + cells.iloc[:, 0]
+        for i in range(1, len(columns)):
+            rows = rows + " | " + cells.iloc[:, i]
+        lines.extend((rows + " |").tolist())
+    
+    return "\n".join(lines)
+
+
 def load_csv(file_path: str) -> str:
     """Load CSV file and convert to readable text."""
     try:
         import pandas as pd
-        df = pd.read_csv(file_path)
-        
-        lines = []
-        lines.append("| " + " | ".join(df.columns) + " |")
-        lines.append("| " + " | ".join(["---"] * len(df.columns)) + " |")
-        
-        for _, row in df.iterrows():
-            lines.append("| " + " | ".join(str(v) for v in row.values) + " |")
-        
-        return "\n".join(lines)
+        try:
+            # pyarrow's multithreaded parser, when installed
+            df = pd.read_csv(file_path, engine="pyarrow")
+        except ImportError:
+            df = pd.read_csv(file_path)
+        return _dataframe_to_markdown(df)
     except ImportError:
         raise ImportError("pandas is required for .csv files: pip install pandas")
 
@@ -178,15 +335,7 @@ def load_excel(file_path: str) -> str:
         for sheet_name in xl.sheet_names:
             df = pd.read_excel(xl, sheet_name=sheet_name)
             all_text.append(f"## Sheet: {sheet_name}\n")
-            
-            lines = []
-            lines.append("| " + " | ".join(str(c) for c in df.columns) + " |")
-            lines.append("| " + " | ".join(["---"] * len(df.columns)) + " |")
-            
-            for _, row in df.iterrows():
-                lines.append("| " + " | ".join(str(v) for v in row.values) + " |")
-            
-            all_text.append("\n".join(lines))
+            all_text.append(_dataframe_to_markdown(df))
         
         return "\n\n".join(all_text)
     except ImportError:
@@ -209,7 +358,7 @@ def load_html(file_path: str) -> str:
     try:
         from bs4 import BeautifulSoup
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            soup = BeautifulSoup(f, 'html.parser')
+            soup = BeautifulSoup(f, _html_parser())
         
         for script in soup(["script", "style"]):
             script.decompose()
@@ -220,10 +369,46 @@ def load_html(file_path: str) -> str:
 
 
 
+_HTTP_CLIENT = None
+
+_URL_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def _get_http_client():
+    """Shared HTTP client so repeated URL loads reuse pooled connections."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        import httpx
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        _HTTP_CLIENT = httpx.Client(
+            http2=http2,
+            follow_redirects=True,
+            verify=False,
+            timeout=30.0,
+            headers=_URL_HEADERS,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+    return _HTTP_CLIENT
+
+
+def _html_parser() -> str:
+    """Prefer the lxml parser backend, falling back to the stdlib one."""
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
 def load_url(url: str) -> str:
     """Load content from a URL."""
     try:
-        import httpx
         from bs4 import BeautifulSoup
         
         if "github.com" in url and "/blob/" in url:
@@ -231,18 +416,13 @@ def load_url(url: str) -> str:
             # to https://raw.githubusercontent.com/user/repo/branch/file.py
             url = url.replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        
-        with httpx.Client(follow_redirects=True, verify=False, timeout=30.0) as client:
-            response = client.get(url, headers=headers)
-            response.raise_for_status()
+        response = _get_http_client().get(url)
+        response.raise_for_status()
             
         if "raw.githubusercontent.com" in url or not response.headers.get("content-type", "").startswith("text/html"):
             return response.text
             
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.content, _html_parser())
         
         for script in soup(["script", "style", "nav", "footer", "iframe"]):
             script.decompose()
@@ -256,70 +436,45 @@ def load_xml(file_path: str) -> str:
     try:
         import xml.etree.ElementTree as ET
         
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        def extract_text(element, depth=0):
-            """Recursively extract text from XML elements."""
-            lines = []
+        # Stream the file instead of building the whole tree: an element's lines
+        # are assembled at its end event, and its children are dropped once
+        # their tails have been read.
+        open_elements = []  # per open element: [(child, child_lines), ...]
+        lines = []
+        for event, element in ET.iterparse(file_path, events=("start", "end")):
+            if event == "start":
+                open_elements.append([])
+                continue
+            
+            children = open_elements.pop()
+            indent = '  ' * len(open_elements)
             tag = element.tag.split('}')[-1] if '}' in element.tag else element.tag  # Remove namespace
             
             # Add element with text
+            lines = []
             if element.text and element.text.strip():
-                lines.append(f"{'  ' * depth}{tag}: {element.text.strip()}")
+                lines.append(f"{indent}{tag}: {element.text.strip()}")
             elif len(element) == 0:
-                lines.append(f"{'  ' * depth}{tag}")
+                lines.append(f"{indent}{tag}")
             
-            # Process children
-            for child in element:
-                lines.extend(extract_text(child, depth + 1))
+            # Children, each followed by its tail text
+            for child, child_lines in children:
+                lines.extend(child_lines)
+                if child.tail and child.tail.strip():
+                    lines.append(f"{indent}  {child.tail.strip()}")
+            del element[:]
             
-            # Add tail text
-            if element.tail and element.tail.strip():
-                lines.append(f"{'  ' * depth}{element.tail.strip()}")
-            
-            return lines
+            if open_elements:
+                open_elements[-1].append((element, lines))
         
-        return "\n".join(extract_text(root))
+        return "\n".join(lines)
     except Exception as e:
         return load_text(file_path)
 
 
 def load_code(file_path: str) -> str:
     """Load source code file with language header."""
-    ext = Path(file_path).suffix.lower()
-    language_map = {
-        ".py": "python",
-        ".js": "javascript",
-        ".ts": "typescript",
-        ".jsx": "javascript",
-        ".tsx": "typescript",
-        ".java": "java",
-        ".cpp": "cpp",
-        ".c": "c",
-        ".h": "c",
-        ".rs": "rust",
-        ".go": "go",
-        ".rb": "ruby",
-        ".php": "php",
-        ".swift": "swift",
-        ".kt": "kotlin",
-        ".sql": "sql",
-        ".sh": "bash",
-        ".bash": "bash",
-        ".css": "css",
-        ".scss": "scss",
-        ".less": "less",
-        ".vue": "vue",
-        ".svelte": "svelte",
-        ".r": "r",
-        ".scala": "scala",
-        ".lua": "lua",
-        ".perl": "perl",
-        ".pl": "perl",
-    }
-    
-    language = language_map.get(ext, "code")
+    language = _EXT_TO_LANG.get(os.path.splitext(file_path)[1].lower(), "code")
     content = load_text(file_path)
     
     return f"```{language}\n{content}\n```"
@@ -355,15 +510,20 @@ def load_image_ocr(file_path: str) -> str:
         raise ImportError("Pillow is required for image processing: pip install pillow")
 
 
-def load_document(file_path: str) -> Dict[str, Any]:
+def load_document(file_path: str, file_type: Optional[str] = None) -> Dict[str, Any]:
     """
     Universal document loader.
     Automatically detects file type and extracts text.
     
+    Args:
+        file_path: Path to the file
+        file_type: Already-detected file type, to skip detection
+    
     Returns:
         Dict with 'text', 'file_type', 'success', and optional 'error'
     """
-    file_type = get_file_type(file_path)
+    if file_type is None:
+        file_type = get_file_type(file_path)
     
     if file_type is None:
         return {
@@ -433,7 +593,6 @@ def load_directory(directory_path: str, recursive: bool = True) -> list:
     Returns:
         List of dicts with document info and extracted text
     """
-    documents = []
     path = Path(directory_path)
     
     if recursive:
@@ -441,16 +600,31 @@ def load_directory(directory_path: str, recursive: bool = True) -> list:
     else:
         files = path.glob("*")
     
-    for file_path in files:
-        if file_path.is_file():
-            file_type = get_file_type(str(file_path))
-            if file_type:
-                result = load_document(str(file_path))
-                result["file_path"] = str(file_path)
-                result["file_name"] = file_path.name
-                documents.append(result)
+    file_paths, file_names, file_types = [], [], []
+    for f in files:
+        file_type = SUPPORTED_EXTENSIONS.get(f.suffix.lower())
+        if file_type and f.is_file():
+            file_paths.append(str(f))
+            file_names.append(f.name)
+            file_types.append(file_type)
+    
+    # Parsers are CPU-bound and independent per file; processes only pay off
+    # once there are enough files to amortize starting them
+    if len(file_paths) < 8:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(file_paths)))
+    else:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count())
     
-    return documents
+    with executor:
+        return list(executor.map(_load_one, file_paths, file_names, file_types, chunksize=4))
+
+
+def _load_one(file_path: str, file_name: str, file_type: str) -> Dict[str, Any]:
+    """Load a single document and annotate it with its path."""
+    result = load_document(file_path, file_type=file_type)
+    result["file_path"] = file_path
+    result["file_name"] = file_name
+    return result
 
 
 def download_youtube_audio(url: str, output_dir: str = "uploads") -> str:
@@ -481,6 +655,12 @@ def download_youtube_audio(url: str, output_dir: str = "uploads") -> str:
             'no_warnings': True,
         }
         
+        # Parallel segment download when aria2c is installed
+        import shutil
+        if shutil.which("aria2c"):
+            ydl_opts['external_downloader'] = {'default': 'aria2c'}
+            ydl_opts['external_downloader_args'] = {'aria2c': ['-x', '16', '-s', '16', '-k', '1M']}
+        
         print(f"Downloading YouTube audio from {url}...")
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.download([url])
@@ -497,3 +677,48 @@ def download_youtube_audio(url: str, output_dir: str = "uploads") -> str:
         raise ImportError("yt-dlp is required: pip install yt-dlp")
     except Exception as e:
         raise Exception(f"YouTube download failed: {str(e)}")
+
+
+def split_audio(
+    file_path: str,
+    output_dir: str,
+    segment_seconds: int = 60,
+    overlap_seconds: float = 2.0
+) -> List[tuple]:
+    """
+    Split an audio file into overlapping segments with ffmpeg.
+    
+    Each segment runs overlap_seconds into the next one, so words at a boundary
+    are heard whole by at least one segment; callers take each word from only
+    one side of the overlap when joining transcripts. Segments are decoded to 16 kHz mono WAV,
+    which Whisper resamples to anyway, so cut points are exact.
+    
+    Args:
+        file_path: Audio file to split
+        output_dir: Directory to write the segments to
+        segment_seconds: Distance between segment starts
+        overlap_seconds: Extra audio at the end of each segment
+        
+    Returns:
+        List of (segment_path, start_seconds) in playback order
+    """
+    import math
+    import subprocess
+    
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+        check=True, capture_output=True, text=True
+    )
+    duration = float(probe.stdout.strip())
+    
+    segments = []
+    for index in range(max(1, math.ceil(duration / segment_seconds))):
+        start = index * segment_seconds
+        segment_path = os.path.join(output_dir, f"chunk_{index:05d}.wav")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-ss", str(start), "-t", str(segment_seconds + overlap_seconds),
+             "-i", file_path, "-ac", "1", "-ar", "16000", segment_path],
+            check=True
+        )
+        segments.append((segment_path, float(start)))
+    return segments
@@ -1,34 +1,134 @@
 from dotenv import load_dotenv
 from pathlib import Path
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from tqdm import tqdm
-import shutil
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+import aiofiles
+import aiopytesseract
+import asyncio
+import bcrypt
+import hashlib
+import logging
+import mimetypes
+import multiprocessing
 import os
+import queue
+import sys
+import tempfile
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from bson import ObjectId
+
+# Motor runs PyMongo calls on a thread pool sized 5 * cpu_count by default;
+# a small pool avoids handoff contention. Must be set before motor is imported.
+os.environ.setdefault("MOTOR_MAX_WORKERS", "8")
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ReturnDocument, WriteConcern
 from src import rag
+from src.loaders import (
+    download_youtube_audio,
+    get_file_type,
+    load_document,
+    load_url,
+    rasterize_pdf,
+    split_audio,
+)
 
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MAX_FULL_CONTEXT = 100000  # Maximum characters to load as full context (100K)
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", 30 * 24 * 3600))  # Seconds to keep extracted text per file hash
+TRANSCRIBE_OVERLAP = float(os.getenv("TRANSCRIBE_OVERLAP", 2.0))  # Seconds neighbouring audio chunks share
+
+
+client = AsyncIOMotorClient(
+    MONGODB_URI,
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL", 50)),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL", 10)),
+    maxIdleTimeMS=60_000,
+    serverSelectionTimeoutMS=3_000,
+    connectTimeoutMS=2_000,
+    retryWrites=True,
+)
+db = client.notebook_llm
 
+# Chat history writes don't wait for the server's ack; the client holds the
+# messages and re-syncs them. Set MESSAGE_WRITE_ACK=1 for acknowledged writes.
+messages_collection = db.get_collection(
+    "notebooks",
+    write_concern=WriteConcern(w=1 if os.getenv("MESSAGE_WRITE_ACK") == "1" else 0),
+)
 
-client = AsyncIOMotorClient(MONGODB_URI)
-db = client.notebook_llm
+# Worker processes for document parsing and PDF rasterization. Spawned rather
+# than forked so workers don't inherit the Mongo client's threads.
+OCR_POOL = ProcessPoolExecutor(
+    max_workers=int(os.getenv("OCR_WORKERS", os.cpu_count() or 1)),
+    mp_context=multiprocessing.get_context("spawn"),
+)
+
+
+request_logger = logging.getLogger("obook.requests")
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+_background_tasks = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _start_logging() -> QueueListener:
+    """
+    Route request logs and the src.* module loggers through a queue so handlers
+    never write to stdout on the event loop or ingest threads.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+    
+    for logger in (request_logger, logging.getLogger("src")):
+        logger.handlers = [QueueHandler(log_queue)]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager - load API keys and settings from database on startup."""
+    try:
+        # Open the pool before the first request needs it
+        await client.admin.command("ping")
+        await db.ocr_cache.create_index("created_at", expireAfterSeconds=OCR_CACHE_TTL)
+        await db.users.create_indexes([IndexModel("email", unique=True)])
+        await db.api_keys.create_indexes([IndexModel([("user_email", 1), ("created_at", -1)])])
+        await db.webhooks.create_indexes([IndexModel([("user_email", 1), ("created_at", -1)])])
+        await db.source_contents.create_indexes([IndexModel([("notebook_id", 1), ("name", 1)], unique=True)])
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+    
+    # Uploads may have changed outside the app; recount them in the background
+    _spawn(_reconcile_storage())
+    _spawn(_migrate_source_contents())
+    _spawn(_backfill_source_paths())
+    
     try:
         settings = await db.settings.find_one({"_id": "global"})
         if settings:
@@ -37,7 +137,7 @@ async def lifespan(app: FastAPI):
 
             api_keys = settings.get("api_keys", {})
             for provider_name, api_key in api_keys.items():
-                if api_key and provider_name in ["openai", "anthropic", "gemini"]:
+                if api_key and provider_name in API_KEY_PROVIDERS:
                     try:
                         provider = registry.get_provider(provider_name)
                         provider.api_key = api_key
@@ -68,13 +168,24 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Error loading settings on startup: {e}")
     
+    # Resumed sources embed with the configured provider, so wait for the settings
+    await _resume_pending_sources()
+    settings_watcher = _spawn(_watch_settings())
+    log_listener = _start_logging()
+    
     yield  # App runs here
     
 
     print("Shutting down...")
+    
+    settings_watcher.cancel()
+    OCR_POOL.shutdown(wait=False, cancel_futures=True)
+    await rag.get_registry().aclose()
+    log_listener.stop()
 
 
-app = FastAPI(lifespan=lifespan)
+# orjson serializes responses faster than the stdlib encoder and emits bytes directly
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -82,43 +193,343 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
 @app.middleware("http")
 async def log_requests(request, call_next):
-    import time
-    start_time = time.time()
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {request.method} {request.url}")
-    
+    start_time = time.perf_counter()
     response = await call_next(request)
     
-    process_time = (time.time() - start_time) * 1000
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {request.method} {request.url} {response.status_code} - {process_time:.2f}ms")
+    # Formatting and the stdout write happen on the listener thread
+    request_logger.info(
+        "%s %s %d - %.2fms",
+        request.method, request.url.path, response.status_code,
+        (time.perf_counter() - start_time) * 1000
+    )
     return response
 
 
 
+@lru_cache(maxsize=4096)
+def _nb_id(notebook_id: str):
+    """Notebook _id as stored: an ObjectId when the string is a valid one, else the raw string."""
+    return ObjectId(notebook_id) if ObjectId.is_valid(notebook_id) else notebook_id
+
+
+def _nb_filter(notebook_id: str) -> dict:
+    return {"_id": _nb_id(notebook_id)}
+
+
+class NotebookLoader:
+    """Coalesces notebook lookups made in the same event loop tick into one $in query."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._pending: Dict[Any, List[asyncio.Future]] = {}
+        self._scheduled = False
+
+    async def load(self, notebook_id: str) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(_nb_id(notebook_id), []).append(future)
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        _spawn(self._fetch(pending))
+
+    async def _fetch(self, pending: Dict[Any, List[asyncio.Future]]):
+        try:
+            docs = await self.collection.find({"_id": {"$in": list(pending)}}).to_list(None)
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        by_id = {doc["_id"]: doc for doc in docs}
+        for nb_id, futures in pending.items():
+            doc = by_id.get(nb_id)
+            for future in futures:
+                if not future.done():
+                    # Callers may mutate the result, so each gets its own copy
+                    future.set_result(dict(doc) if doc is not None else None)
+
+
+notebook_loader = NotebookLoader(db.notebooks)
+
+
 class ChatRequest(BaseModel):
     notebook_id: str
     messages: List[dict]
     selected_sources: List[str] = None
 
 
+def _uploads_size() -> tuple:
+    """Walk uploads/ and return (total bytes, file count)."""
+    total = count = 0
+    uploads_dir = Path("uploads")
+    if uploads_dir.exists():
+        for f in uploads_dir.glob("**/*"):
+            if f.is_file():
+                total += f.stat().st_size
+                count += 1
+    return total, count
+
+
+async def _add_storage(size: int, files: int = 1):
+    await db.stats.update_one(
+        {"_id": "global"},
+        {"$inc": {"storage_bytes": size, "file_count": files}},
+        upsert=True
+    )
+
+
+async def _reconcile_storage():
+    """Resync the storage counter with what is actually on disk."""
+    try:
+        total, count = await asyncio.to_thread(_uploads_size)
+        await db.stats.update_one(
+            {"_id": "global"},
+            {"$set": {"storage_bytes": total, "file_count": count}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Error reconciling storage stats: {e}")
+
+
+async def _save_source_content(notebook_id: str, name: str, content: str):
+    """Store a source's extracted text outside the notebook document."""
+    await db.source_contents.replace_one(
+        {"notebook_id": notebook_id, "name": name},
+        {"notebook_id": notebook_id, "name": name, "content": content},
+        upsert=True
+    )
+
+
+async def _migrate_source_contents():
+    """Move content still embedded in notebook sources into source_contents."""
+    try:
+        async for nb in db.notebooks.find({"sources.content": {"$exists": True}}, {"sources": 1}):
+            for source in nb.get("sources", []):
+                if source.get("content"):
+                    await _save_source_content(str(nb["_id"]), source["name"], source["content"])
+            await db.notebooks.update_one({"_id": nb["_id"]}, {"$unset": {"sources.$[].content": ""}})
+    except Exception as e:
+        print(f"Error migrating source contents: {e}")
+
+
+async def _transcribe_stream(file_path: str) -> AsyncGenerator[str, None]:
+    """
+    Transcribe audio as fixed-length segments, TRANSCRIBE_WORKERS at a time,
+    yielding each segment's text in order as soon as it is ready.
+    """
+    loop = asyncio.get_running_loop()
+    # Threads rather than processes: the Whisper model is loaded once per process
+    with tempfile.TemporaryDirectory() as chunk_dir:
+        try:
+            chunks = await loop.run_in_executor(None, split_audio, file_path, chunk_dir, 60, TRANSCRIBE_OVERLAP)
+        except Exception as e:
+            print(f"Audio split failed, transcribing whole file: {e}")
+            yield await loop.run_in_executor(None, rag.transcribe_audio, file_path)
+            return
+        
+        sem = asyncio.Semaphore(rag.TRANSCRIBE_WORKERS)
+        
+        # Neighbouring chunks share TRANSCRIBE_OVERLAP seconds; each word is taken from
+        # whichever chunk it starts in relative to a seam in the middle of that overlap
+        seams = [offset + TRANSCRIBE_OVERLAP / 2 for _, offset in chunks[1:]]
+        bounds = list(zip([None] + seams, seams + [None]))
+        
+        async def transcribe(chunk_path: str, offset: float, keep_from, keep_before) -> List[tuple]:
+            async with sem:
+                return await loop.run_in_executor(
+                    None, rag.transcribe_segments, chunk_path, offset, keep_from, keep_before
+                )
+        
+        tasks = [
+            asyncio.ensure_future(transcribe(path, offset, *bound))
+            for (path, offset), bound in zip(chunks, bounds)
+        ]
+        try:
+            for task in tasks:
+                yield rag.format_transcript(await task)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _transcribe_chunked(file_path: str) -> str:
+    """Transcribe a whole audio file with _transcribe_stream."""
+    async with aclosing(_transcribe_stream(file_path)) as segments:
+        return "".join([text async for text in segments])
+
+
+async def _transcribe_and_index(notebook_id: str, filename: str, file_path: str) -> Tuple[str, bool]:
+    """
+    Transcribe audio, indexing each segment while later ones are still transcribing.
+    
+    Returns:
+        (transcript, indexed). indexed is False when incremental indexing failed and
+        the transcript still has to go through rag.process_document.
+    """
+    parts = []
+    chunk_count = 0
+    indexed = True
+    async with aclosing(_transcribe_stream(file_path)) as segments:
+        async for text in segments:
+            parts.append(text)
+            if not indexed:
+                continue
+            try:
+                chunk_count += await asyncio.to_thread(
+                    rag.get_rag_chain().append_source_text, notebook_id, filename, "audio", text, chunk_count
+                )
+            except Exception as e:
+                print(f"Incremental indexing failed, indexing after transcription: {e}")
+                indexed = False
+    
+    if indexed:
+        await asyncio.to_thread(rag.get_rag_chain().finish_source, notebook_id, filename, chunk_count)
+    return "".join(parts), indexed
+
+
+def _scan_legacy_uploads() -> Dict[str, str]:
+    """Map source name -> newest "{uuid}_{name}" upload across the upload dirs."""
+    newest: Dict[str, tuple] = {}
+    # Check both /tmp/uploads (legacy) and new uploads dir
+    for d in ["/tmp/uploads", os.path.join(os.getcwd(), "uploads")]:
+        if not os.path.isdir(d):
+            continue
+        with os.scandir(d) as entries:
+            for entry in entries:
+                if "_" not in entry.name or not entry.is_file(follow_symlinks=False):
+                    continue
+                name = entry.name.split("_", 1)[1]
+                ctime = entry.stat(follow_symlinks=False).st_ctime
+                if name not in newest or ctime > newest[name][0]:
+                    newest[name] = (ctime, entry.path)
+    return {name: path for name, (_, path) in newest.items()}
+
+
+async def _backfill_source_paths():
+    """Store file_path on legacy sources uploaded before it was recorded."""
+    try:
+        notebooks = await db.notebooks.find(
+            {"sources": {"$elemMatch": {"file_path": None}}}, {"sources.name": 1, "sources.file_path": 1}
+        ).to_list(None)
+        if not notebooks:
+            return
+        
+        uploads = await asyncio.to_thread(_scan_legacy_uploads)
+        for nb in notebooks:
+            for source in nb.get("sources", []):
+                path = uploads.get(source["name"])
+                if not source.get("file_path") and path:
+                    await db.notebooks.update_one(
+                        {"_id": nb["_id"], "sources.name": source["name"]},
+                        {"$set": {"sources.$.file_path": path}}
+                    )
+    except Exception as e:
+        print(f"Error backfilling source paths: {e}")
+
+
+async def _resume_pending_sources():
+    """
+    Re-queue uploads left in "processing" by a restart; OCR picks up from its checkpoint.
+    Awaited before the app serves requests, so the snapshot cannot include new uploads,
+    which /upload queues itself.
+    """
+    try:
+        notebooks = await db.notebooks.find({"sources.status": "processing"}, {"sources": 1}).to_list(None)
+        for nb in notebooks:
+            for source in nb.get("sources", []):
+                file_path = source.get("file_path")
+                if source.get("status") == "processing" and file_path and os.path.isfile(file_path):
+                    print(f"Resuming processing of {source['name']}")
+                    _spawn(process_file_task(str(nb["_id"]), file_path, source["name"]))
+    except Exception as e:
+        print(f"Error resuming pending sources: {e}")
+
+
+async def _ocr_pages(page_images: List[bytes], digest: Optional[str] = None) -> str:
+    """
+    OCR pages concurrently, bounded by OCR_CONCURRENCY tesseract processes.
+    
+    Args:
+        page_images: Encoded page images, in page order
+        digest: Content hash of the source file. When given, each finished page
+            is checkpointed in ocr_progress and pages from an earlier interrupted
+            run are reused.
+    """
+    done = {}
+    if digest:
+        progress = await db.ocr_progress.find_one({"_id": digest})
+        done = progress.get("pages", {}) if progress else {}
+        if done:
+            print(f"Resuming OCR with {len(done)} of {len(page_images)} pages done")
+    
+    sem = asyncio.Semaphore(int(os.getenv("OCR_CONCURRENCY", os.cpu_count() or 1)))
+    
+    async def ocr_page(i: int, image: bytes) -> str:
+        if str(i) in done:
+            return done[str(i)]
+        async with sem:
+            text = await aiopytesseract.image_to_string(image)
+        if digest:
+            await db.ocr_progress.update_one({"_id": digest}, {"$set": {f"pages.{i}": text}}, upsert=True)
+        return text
+    
+    results = await asyncio.gather(*(ocr_page(i, image) for i, image in enumerate(page_images)))
+    if digest:
+        await db.ocr_progress.delete_one({"_id": digest})
+    return "\n".join(results)
+
+
+def _hash_file(file_path: str) -> str:
+    """BLAKE2b digest of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 async def process_file_task(notebook_id: str, file_path: str, filename: str):
     try:
-        from src.loaders import load_document, get_file_type
         
 
         file_type = get_file_type(file_path)
         print(f"Processing file: {filename} (type: {file_type})")
         
-
-        if file_type == "audio":
-            content = rag.transcribe_audio(file_path)
+        # Parsing, rasterizing and transcription are CPU-bound; keep them off the event loop
+        loop = asyncio.get_running_loop()
+        
+        # Identical bytes were already extracted once; reuse that text
+        digest = await loop.run_in_executor(None, _hash_file, file_path)
+        cached = await db.ocr_cache.find_one({"_id": digest})
+        indexed = False
+        # Failed or near-empty extractions are not cached, so a re-upload retries them
+        cacheable = not cached
+
+        if cached:
+            print(f"Using cached extraction for {filename}")
+            content = cached["content"]
+            source_type = cached["source_type"]
+        elif file_type == "audio":
+            # Segments are embedded as they finish, so the start of a long recording is searchable early
+            content, indexed = await _transcribe_and_index(notebook_id, filename, file_path)
             source_type = "audio"
         else:
 
-            result = load_document(file_path)
+            result = await loop.run_in_executor(OCR_POOL, load_document, file_path)
             
             if not result["success"]:
                 raise ValueError(f"Failed to load document: {result.get('error', 'Unknown error')}")
@@ -129,83 +540,67 @@ async def process_file_task(notebook_id: str, file_path: str, filename: str):
 
             if source_type == "pdf" and (not content or len(content) < 50):
                 print("PDF has no text, attempting OCR...")
+                cacheable = False
                 try:
-                    from pdf2image import convert_from_path
-                    import pytesseract
-                    
-                    images = convert_from_path(file_path, dpi=300)
-                    print(f"Converted {len(images)} pages for OCR")
+                    page_images = await loop.run_in_executor(OCR_POOL, rasterize_pdf, file_path, 300)
+                    print(f"Converted {len(page_images)} pages for OCR")
                     
-                    ocr_content = ""
-                    for i, image in tqdm(enumerate(images), total=len(images), desc="OCR", unit="page"):
-                        ocr_content += pytesseract.image_to_string(image) + "\n"
-                    
-                    content = ocr_content.strip()
+                    content = (await _ocr_pages(page_images, digest)).strip()
                     print(f"OCR extracted {len(content)} characters")
+                    cacheable = len(content) >= 50
                 except Exception as e:
                     print(f"OCR failed: {e}")
             
             if not content:
                 raise ValueError(f"No text extracted from {filename}")
         
+        if cacheable:
+            await db.ocr_cache.update_one(
+                {"_id": digest},
+                {"$set": {"content": content, "source_type": source_type, "created_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        
         print(f"Extracted {len(content)} characters from {filename}")
 
 
-        rag.process_document(notebook_id, file_path, content, source_type, filename)
+        if not indexed:
+            await asyncio.to_thread(rag.process_document, notebook_id, file_path, content, source_type, filename)
         
 
-        from bson import ObjectId
         print(f"DEBUG: Processing complete for {filename}. Content length: {len(content)}")
         
-        try:
-            result = await db.notebooks.update_one(
-                {"_id": ObjectId(notebook_id), "sources.name": filename},
-                {"$set": {"sources.$.status": "ready", "sources.$.content": content, "sources.$.type": source_type}}
-            )
-            print(f"DEBUG: DB Update (ObjectId) matched={result.matched_count} modified={result.modified_count}")
-        except Exception as e:
-            print(f"DEBUG: Retry with string ID due to: {e}")
-            result = await db.notebooks.update_one(
-                {"_id": notebook_id, "sources.name": filename},
-                {"$set": {"sources.$.status": "ready", "sources.$.content": content, "sources.$.type": source_type}}
-            )
-            print(f"DEBUG: DB Update (String ID) matched={result.matched_count} modified={result.modified_count}")
+        await _save_source_content(notebook_id, filename, content)
+        
+        result = await db.notebooks.update_one(
+            {"_id": _nb_id(notebook_id), "sources.name": filename},
+            {"$set": {"sources.$.status": "ready", "sources.$.type": source_type}}
+        )
+        print(f"DEBUG: DB Update matched={result.matched_count} modified={result.modified_count}")
         
     except Exception as e:
         print(f"Error processing file: {e}")
-        from bson import ObjectId
-        try:
-            await db.notebooks.update_one(
-                {"_id": ObjectId(notebook_id), "sources.name": filename},
-                {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
-            )
-        except:
-             await db.notebooks.update_one(
-                {"_id": notebook_id, "sources.name": filename},
-                {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
-            )
+        await db.notebooks.update_one(
+            {"_id": _nb_id(notebook_id), "sources.name": filename},
+            {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
+        )
     # Note: File is kept in uploads/ for viewing via /raw endpoint
 
-@app.post("/upload")
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    notebook_id: str = Form(...)
-):
-    # Save file to persistent storage
+async def _save_upload(file: UploadFile) -> dict:
+    """Stream an upload into uploads/ and return its source item."""
     upload_dir = os.path.join(os.getcwd(), "uploads")
     os.makedirs(upload_dir, exist_ok=True)
     file_path = os.path.join(upload_dir, f"{uuid.uuid4()}_{file.filename}")
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(1 << 20):
+            await buffer.write(chunk)
         
 
-    from src.loaders import get_file_type
     detected_type = get_file_type(file.filename)
     source_type = detected_type if detected_type else "text"
         
-    source_item = {
+    return {
         "name": file.filename,
         "type": source_type,
         "status": "processing",
@@ -213,25 +608,26 @@ async def upload_file(
     }
 
 
-    from bson import ObjectId
-    try:
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {
-                "$push": {"sources": source_item},
-                "$inc": {"source_count": 1}
-            }
-        )
-    except:
-        await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {
-                "$push": {"sources": source_item},
-                "$inc": {"source_count": 1}
-            }
-        )
+@app.post("/upload")
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    notebook_id: str = Form(...)
+):
+    # Save file to persistent storage
+    source_item = await _save_upload(file)
+    await _add_storage(os.path.getsize(source_item["file_path"]))
+
+
+    await db.notebooks.update_one(
+        _nb_filter(notebook_id),
+        {
+            "$push": {"sources": source_item},
+            "$inc": {"source_count": 1}
+        }
+    )
     
-    background_tasks.add_task(process_file_task, notebook_id, file_path, file.filename)
+    background_tasks.add_task(process_file_task, notebook_id, source_item["file_path"], file.filename)
     
     return {"status": "processing", "notebook_id": notebook_id}
 
@@ -242,8 +638,6 @@ class UrlUploadRequest(BaseModel):
 
 async def process_url_task(notebook_id: str, url: str):
     try:
-        from src.loaders import load_url, download_youtube_audio
-        import os
         
         print(f"Processing URL: {url}")
         
@@ -256,9 +650,10 @@ async def process_url_task(notebook_id: str, url: str):
             upload_dir = os.path.join(os.getcwd(), "uploads")
 
             file_path = download_youtube_audio(url, upload_dir)
+            await _add_storage(os.path.getsize(file_path))
             
             print(f"Transcribing YouTube audio: {file_path}")
-            content = rag.transcribe_audio(file_path)
+            content = await _transcribe_chunked(file_path)
             source_type = "audio"
             source_name = url
         else:
@@ -273,15 +668,15 @@ async def process_url_task(notebook_id: str, url: str):
         print(f"Extracted {len(content)} characters from {url}")
         
 
-        rag.process_document(notebook_id, file_path, content, source_type, source_name)
+        await asyncio.to_thread(rag.process_document, notebook_id, file_path, content, source_type, source_name)
         
 
-        from bson import ObjectId
         print(f"Processing complete for {url}")
         
+        await _save_source_content(notebook_id, url, content)
+        
         update_fields = {
             "sources.$.status": "ready", 
-            "sources.$.content": content, 
             "sources.$.type": source_type
         }
         
@@ -289,31 +684,18 @@ async def process_url_task(notebook_id: str, url: str):
             # Update file_path so the raw endpoint serves the MP3
             update_fields["sources.$.file_path"] = file_path
         
-        try:
-            result = await db.notebooks.update_one(
-                {"_id": ObjectId(notebook_id), "sources.name": url},
-                {"$set": update_fields}
-            )
-        except Exception:
-            await db.notebooks.update_one(
-                {"_id": notebook_id, "sources.name": url},
-                {"$set": update_fields}
-            )
+        await db.notebooks.update_one(
+            {"_id": _nb_id(notebook_id), "sources.name": url},
+            {"$set": update_fields}
+        )
             
     except Exception as e:
         print(f"Error processing URL {url}: {e}")
         # Update status to error
-        from bson import ObjectId
-        try:
-            await db.notebooks.update_one(
-                {"_id": ObjectId(notebook_id), "sources.name": url},
-                {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
-            )
-        except Exception:
-             await db.notebooks.update_one(
-                {"_id": notebook_id, "sources.name": url},
-                {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
-            )
+        await db.notebooks.update_one(
+            {"_id": _nb_id(notebook_id), "sources.name": url},
+            {"$set": {"sources.$.status": "error", "sources.$.error": str(e)}}
+        )
 
 
 @app.post("/upload/url")
@@ -332,30 +714,30 @@ async def upload_url(request: UrlUploadRequest, background_tasks: BackgroundTask
     }
 
 
-    from bson import ObjectId
-    try:
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {
-                "$push": {"sources": source_item},
-                "$inc": {"source_count": 1}
-            }
-        )
-    except:
-        await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {
-                "$push": {"sources": source_item},
-                "$inc": {"source_count": 1}
-            }
-        )
+    await db.notebooks.update_one(
+        _nb_filter(notebook_id),
+        {
+            "$push": {"sources": source_item},
+            "$inc": {"source_count": 1}
+        }
+    )
     
     background_tasks.add_task(process_url_task, notebook_id, url)
     
     return {"status": "processing", "notebook_id": notebook_id}
 
 
-from fastapi.responses import FileResponse
+@app.get("/notebooks/{notebook_id}/sources/{source_name:path}/content")
+async def get_source_content(notebook_id: str, source_name: str):
+    """Get the extracted text of one source."""
+    doc = await db.source_contents.find_one(
+        {"notebook_id": notebook_id, "name": source_name},
+        {"_id": 0, "name": 1, "content": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Source content not found")
+    return doc
+
 
 @app.get("/notebooks/{notebook_id}/sources/{raw_path:path}")
 async def get_source_file(notebook_id: str, raw_path: str):
@@ -364,12 +746,7 @@ async def get_source_file(notebook_id: str, raw_path: str):
         raise HTTPException(status_code=404, detail="Endpoint not found")
     
     source_name = raw_path[:-4]
-    pass
-    from bson import ObjectId
-    try:
-        notebook = await db.notebooks.find_one({"_id": ObjectId(notebook_id)})
-    except:
-        notebook = await db.notebooks.find_one({"_id": notebook_id})
+    notebook = await notebook_loader.load(notebook_id)
         
     if not notebook or "sources" not in notebook:
         raise HTTPException(status_code=404, detail="Notebook or source not found")
@@ -380,110 +757,81 @@ async def get_source_file(notebook_id: str, raw_path: str):
         
     file_path = source.get("file_path")
     
-    # Fallback: legacy files might not have file_path stored.
-    # Search in uploads dir for a file ending with _{source_name}
-    if not file_path or not os.path.exists(file_path):
-        import glob
-        # Check both /tmp/uploads (legacy) and new uploads dir
-        potential_dirs = ["/tmp/uploads", os.path.join(os.getcwd(), "uploads")]
-        
-        matches = []
-        for d in potential_dirs:
-            if os.path.exists(d):
-                pattern = os.path.join(d, f"*_{source_name}")
-                matches.extend(glob.glob(pattern))
-        
-        if matches:
-            # Use the most recent one if duplicates (unlikely with UUIDs but possible if re-uploaded)
-            file_path = max(matches, key=os.path.getctime)
-            
-            # Update DB to store this path for future
-            try:
-                if notebook.get("_id"):
-                    filter_q = {"_id": notebook["_id"], "sources.name": source_name}
-                else:
-                    filter_q = {"_id": notebook_id, "sources.name": source_name}
-                    
-                await db.notebooks.update_one(
-                    filter_q,
-                    {"$set": {"sources.$.file_path": file_path}}
-                )
-            except Exception as e:
-                print(f"Failed to update file_path in DB: {e}")
-        else:
-             raise HTTPException(status_code=404, detail="Source file not found on server")
-
-    return FileResponse(file_path, filename=source_name)
+    # Legacy sources get their file_path backfilled on startup
+    try:
+        stat_result = os.stat(file_path) if file_path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Source file not found on server")
+
+    # Type comes from the stored file, since YouTube sources are named by URL
+    return FileResponse(
+        file_path,
+        filename=source_name,
+        stat_result=stat_result,
+        media_type=mimetypes.guess_type(file_path)[0],
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
+    nb_id = _nb_id(request.notebook_id)
 
     user_msg = request.messages[-1]
-    if user_msg["role"] == "user":
-        from bson import ObjectId
-        try:
-            await db.notebooks.update_one(
-                {"_id": ObjectId(request.notebook_id)},
-                {"$push": {"messages": user_msg}}
-            )
-        except:
-             await db.notebooks.update_one(
-                {"_id": request.notebook_id},
-                {"$push": {"messages": user_msg}}
-            )
 
     async def stream_and_save():
 
         full_source_content = []
         if request.selected_sources:
             try:
-                from bson import ObjectId
-                try: 
-                    nb_id_obj = ObjectId(request.notebook_id)
-                    nb = await db.notebooks.find_one({"_id": nb_id_obj})
-                except:
-                    nb = await db.notebooks.find_one({"_id": request.notebook_id})
+                # Fetch and size only the selected sources server-side
+                pipeline = [
+                    {"$match": {
+                        "notebook_id": request.notebook_id,
+                        "name": {"$in": request.selected_sources},
+                        "content": {"$nin": [None, ""]},
+                    }},
+                    {"$sort": {"_id": 1}},
+                    {"$group": {
+                        "_id": None,
+                        "sources": {"$push": {"name": "$name", "content": "$content"}},
+                        "total_chars": {"$sum": {"$strLenCP": "$content"}},
+                    }},
+                    {"$project": {
+                        "sources": {"$cond": [{"$lt": ["$total_chars", MAX_FULL_CONTEXT]}, "$sources", []]},
+                    }},
+                ]
                 
-                if nb and "sources" in nb:
-                    total_chars = 0
-                    temp_content = []
-                    
-                    for s in nb["sources"]:
-                        if s["name"] in request.selected_sources:
-                            c = s.get("content", "")
-                            if c:
-                                temp_content.append({"name": s["name"], "content": c})
-                                total_chars += len(c)
-                    
-                    if 0 < total_chars < MAX_FULL_CONTEXT:
-                        full_source_content = temp_content
+                results = await db.source_contents.aggregate(pipeline).to_list(1)
+                if results:
+                    full_source_content = results[0]["sources"]
             except Exception as e:
                 print(f"Error loading full context: {e}")
 
-        full_response = ""
-
-        async for chunk in rag.stream_chat_response(
-            request.notebook_id, 
-            request.messages, 
-            selected_sources=request.selected_sources, 
-            full_source_content=full_source_content
-        ):
-            full_response += chunk
-            yield chunk
-            
+        chunks: List[str] = []
 
-        assistant_msg = {"role": "assistant", "content": full_response}
-        from bson import ObjectId
         try:
-            await db.notebooks.update_one(
-                {"_id": ObjectId(request.notebook_id)},
-                {"$push": {"messages": assistant_msg}}
-            )
-        except:
-             await db.notebooks.update_one(
-                {"_id": request.notebook_id},
-                {"$push": {"messages": assistant_msg}}
-            )
+            async for chunk in rag.stream_chat_response(
+                request.notebook_id, 
+                request.messages, 
+                selected_sources=request.selected_sources, 
+                full_source_content=full_source_content
+            ):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # One write per turn. It runs as its own task because a client disconnect
+            # closes this generator, and an await here would never complete; whatever
+            # was streamed before the disconnect is kept
+            new_messages = [user_msg] if user_msg["role"] == "user" else []
+            if chunks:
+                new_messages.append({"role": "assistant", "content": "".join(chunks)})
+            if new_messages:
+                _spawn(messages_collection.update_one(
+                    {"_id": nb_id},
+                    {"$push": {"messages": {"$each": new_messages}}}
+                ))
 
     return StreamingResponse(
         stream_and_save(),
@@ -519,17 +867,16 @@ async def create_notebook(request: CreateNotebookRequest):
 
 # Notebook data endpoints
 @app.get("/notebooks/{notebook_id}")
-async def get_notebook(notebook_id: str):
-    """Get notebook with sources and messages."""
-    from bson import ObjectId
-    try:
-        notebook = await db.notebooks.find_one({"_id": ObjectId(notebook_id)})
-    except:
-        notebook = await db.notebooks.find_one({"_id": notebook_id})
+async def get_notebook(notebook_id: str, background_tasks: BackgroundTasks):
+    """Get notebook with sources and messages. Source text is served separately."""
+    notebook = await notebook_loader.load(notebook_id)
     
     if not notebook:
         raise HTTPException(status_code=404, detail="Notebook not found")
     
+    # Warm the vector index for this notebook ahead of the first question
+    background_tasks.add_task(rag.get_rag_chain().prewarm, notebook_id)
+    
     notebook["id"] = str(notebook["_id"])
     del notebook["_id"]
     return notebook
@@ -539,26 +886,16 @@ class RenameNotebookRequest(BaseModel):
 
 @app.put("/notebooks/{notebook_id}/rename")
 async def rename_notebook(notebook_id: str, request: RenameNotebookRequest):
-    from bson import ObjectId
-    try:
-        result = await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {"$set": {"title": request.title}}
-        )
-    except:
-        result = await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {"$set": {"title": request.title}}
-        )
+    await db.notebooks.update_one(
+        _nb_filter(notebook_id),
+        {"$set": {"title": request.title}}
+    )
     return {"status": "ok", "title": request.title}
 
 @app.delete("/notebooks/{notebook_id}")
 async def delete_notebook(notebook_id: str):
-    from bson import ObjectId
-    try:
-        result = await db.notebooks.delete_one({"_id": ObjectId(notebook_id)})
-    except:
-        result = await db.notebooks.delete_one({"_id": notebook_id})
+    await db.notebooks.delete_one(_nb_filter(notebook_id))
+    await db.source_contents.delete_many({"notebook_id": notebook_id})
     return {"status": "ok"}
 
 class SourceItem(BaseModel):
@@ -574,71 +911,47 @@ async def add_source(notebook_id: str, source: SourceItem):
     # Process text sources immediately
     if source.type == 'text' and source.content:
         try:
-            rag.process_document(notebook_id, "", source.content, source.type, source.name)
+            await asyncio.to_thread(rag.process_document, notebook_id, "", source.content, source.type, source.name)
             source.status = 'ready'
         except Exception as e:
             print(f"Error indexing text source: {e}")
             source.status = 'error'
 
-    from bson import ObjectId
-    try:
-        result = await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {
-                "$push": {"sources": source.dict()},
-                "$inc": {"source_count": 1}
-            }
-        )
-    except:
-        result = await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {
-                "$push": {"sources": source.dict()},
-                "$inc": {"source_count": 1}
-            }
-        )
+    if source.content:
+        await _save_source_content(notebook_id, source.name, source.content)
+
+    await db.notebooks.update_one(
+        _nb_filter(notebook_id),
+        {
+            "$push": {"sources": source.model_dump(exclude={"content"})},
+            "$inc": {"source_count": 1}
+        }
+    )
     return {"status": "ok"}
 
 @app.put("/notebooks/{notebook_id}/sources/{source_name}/status")
 async def update_source_status(notebook_id: str, source_name: str, status: str = Form(...)):
     """Update source status."""
-    from bson import ObjectId
-    try:
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id), "sources.name": source_name},
-            {"$set": {"sources.$.status": status}}
-        )
-    except:
-        await db.notebooks.update_one(
-            {"_id": notebook_id, "sources.name": source_name},
-            {"$set": {"sources.$.status": status}}
-        )
+    await db.notebooks.update_one(
+        {"_id": _nb_id(notebook_id), "sources.name": source_name},
+        {"$set": {"sources.$.status": status}}
+    )
     return {"status": "ok"}
 
 @app.delete("/notebooks/{notebook_id}/sources/{source_name:path}")
 async def delete_source(notebook_id: str, source_name: str):
     """Remove a source from the notebook."""
-    from bson import ObjectId
-    try:
-
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {
-                "$pull": {"sources": {"name": source_name}},
-                "$inc": {"source_count": -1}
-            }
-        )
-    except:
-         await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {
-                 "$pull": {"sources": {"name": source_name}},
-                 "$inc": {"source_count": -1}
-            }
-        )
+    await db.notebooks.update_one(
+        _nb_filter(notebook_id),
+        {
+            "$pull": {"sources": {"name": source_name}},
+            "$inc": {"source_count": -1}
+        }
+    )
+    await db.source_contents.delete_one({"notebook_id": notebook_id, "name": source_name})
     
 
-    rag.delete_source_documents(notebook_id, source_name)
+    await asyncio.to_thread(rag.delete_source_documents, notebook_id, source_name)
     
     return {"status": "ok"}
 
@@ -651,36 +964,26 @@ class MessageItem(BaseModel):
 @app.post("/notebooks/{notebook_id}/messages")
 async def add_message(notebook_id: str, message: MessageItem):
     """Add a message to the notebook."""
-    from bson import ObjectId
-    try:
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {"$push": {"messages": message.dict()}}
-        )
-    except:
-        await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {"$push": {"messages": message.dict()}}
-        )
+    await messages_collection.update_one(
+        _nb_filter(notebook_id),
+        {"$push": {"messages": message.model_dump()}}
+    )
     return {"status": "ok"}
 
 @app.put("/notebooks/{notebook_id}/messages")
 async def update_messages(notebook_id: str, messages: List[MessageItem]):
     """Replace all messages in the notebook."""
-    from bson import ObjectId
-    try:
-        await db.notebooks.update_one(
-            {"_id": ObjectId(notebook_id)},
-            {"$set": {"messages": [m.dict() for m in messages]}}
-        )
-    except:
-        await db.notebooks.update_one(
-            {"_id": notebook_id},
-            {"$set": {"messages": [m.dict() for m in messages]}}
-        )
+    await messages_collection.update_one(
+        _nb_filter(notebook_id),
+        {"$set": {"messages": [m.model_dump() for m in messages]}}
+    )
     return {"status": "ok"}
 
 
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(12)).decode()
+
+
 class RegisterRequest(BaseModel):
     name: str
     email: str
@@ -688,7 +991,6 @@ class RegisterRequest(BaseModel):
 
 @app.post("/auth/register")
 async def register_user(request: RegisterRequest):
-    import bcrypt
     
 
     existing_user = await db.users.find_one({"email": request.email})
@@ -696,7 +998,7 @@ async def register_user(request: RegisterRequest):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password with bcrypt
-    password_hash = bcrypt.hashpw(request.password.encode(), bcrypt.gensalt(12)).decode()
+    password_hash = await asyncio.to_thread(_hash_password, request.password)
     
     new_user = {
         "name": request.name,
@@ -715,11 +1017,17 @@ async def get_stats():
     notebook_count = await db.notebooks.count_documents({})
     
     # 2. Count sources & messages aggregation
-    # We'll do a single pass to get totals and history approximation
+    # One pass: per-day history and overall totals from the same projection.
+    # Non-ObjectId ids have no creation date and fall into a null ("Unknown") day.
     pipeline = [
         {
             "$project": {
-                "date": { "$dateToString": { "format": "%Y-%m-%d", "date": { "$toDate": "$_id" } } },
+                "date": {
+                    "$dateToString": {
+                        "format": "%Y-%m-%d",
+                        "date": { "$convert": { "input": "$_id", "to": "date", "onError": None, "onNull": None } }
+                    }
+                },
                 "s_count": { "$size": { "$ifNull": ["$sources", []] } },
                 "m_count": { "$size": { "$ifNull": ["$messages", []] } },
                 "assistant_m_count": {
@@ -734,45 +1042,46 @@ async def get_stats():
             }
         },
         {
-            "$group": {
-                "_id": "$date",
-                "notebooks": { "$sum": 1 },
-                "sources": { "$sum": "$s_count" },
-                "messages": { "$sum": "$m_count" },
-                "api_requests": { "$sum": "$assistant_m_count" }
+            "$facet": {
+                "history": [
+                    {
+                        "$group": {
+                            "_id": "$date",
+                            "notebooks": { "$sum": 1 },
+                            "sources": { "$sum": "$s_count" },
+                            "messages": { "$sum": "$m_count" },
+                            "api_requests": { "$sum": "$assistant_m_count" }
+                        }
+                    },
+                    { "$sort": { "_id": 1 } },
+                    { "$limit": 100 }
+                ],
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "sources": { "$sum": "$s_count" },
+                            "messages": { "$sum": "$m_count" },
+                            "api_requests": { "$sum": "$assistant_m_count" }
+                        }
+                    }
+                ]
             }
-        },
-        { "$sort": { "_id": 1 } }
+        }
     ]
     
     history_data = []
+    totals = {}
     try:
-        history_data = await db.notebooks.aggregate(pipeline).to_list(100)
+        res = (await db.notebooks.aggregate(pipeline).to_list(1))[0]
+        history_data = res["history"]
+        totals = res["totals"][0] if res["totals"] else {}
     except Exception as e:
         print(f"Stats aggregation error: {e}")
 
-    # Compute totals from history aggregation OR fallback
-    if history_data:
-        total_sources = sum(d["sources"] for d in history_data)
-        total_messages = sum(d["messages"] for d in history_data)
-        total_api_requests = sum(d["api_requests"] for d in history_data)
-    else:
-        # Fallback totals if aggregation failed
-        # Just use separate simple counts
-        s_res = await db.notebooks.aggregate([{"$group": {"_id": None, "c": {"$sum": {"$size": {"$ifNull": ["$sources", []]}}}}} ]).to_list(1)
-        total_sources = s_res[0]["c"] if s_res else 0
-        total_api_requests = 0 # Difficult to count without unwind
-        total_messages = 0
-
-    # Fallback History if empty but we have notebooks (e.g. non-ObjectId IDs)
-    if not history_data and notebook_count > 0:
-        from datetime import datetime
-        history_data = [{
-            "_id": datetime.now().strftime("%Y-%m-%d"),
-            "notebooks": notebook_count,
-            "sources": total_sources,
-            "api_requests": total_api_requests
-        }]
+    total_sources = totals.get("sources", 0)
+    total_messages = totals.get("messages", 0)
+    total_api_requests = totals.get("api_requests", 0)
 
     # Ensure at least 2 points for Line Chart aesthetics
     if len(history_data) == 1:
@@ -788,12 +1097,8 @@ async def get_stats():
     labels = [str(d.get("_id") or "Unknown") for d in history_data]
     
     # 4. Storage Used
-    storage_bytes = 0
-    uploads_dir = Path("uploads")
-    if uploads_dir.exists():
-        for f in uploads_dir.glob("**/*"):
-            if f.is_file():
-                storage_bytes += f.stat().st_size
+    stats_doc = await db.stats.find_one({"_id": "global"})
+    storage_bytes = stats_doc.get("storage_bytes", 0) if stats_doc else 0
             
     return {
         "notebooks": notebook_count,
@@ -840,18 +1145,17 @@ class ChangePasswordRequest(BaseModel):
 
 @app.post("/auth/password")
 async def change_password(request: ChangePasswordRequest):
-    import bcrypt
     
     user = await db.users.find_one({"email": request.email})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify current password with bcrypt
-    if not bcrypt.checkpw(request.current_password.encode(), user.get("password", "").encode()):
+    if not await asyncio.to_thread(bcrypt.checkpw, request.current_password.encode(), user.get("password", "").encode()):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
     # Hash new password with bcrypt
-    new_hash = bcrypt.hashpw(request.new_password.encode(), bcrypt.gensalt(12)).decode()
+    new_hash = await asyncio.to_thread(_hash_password, request.new_password)
     await db.users.update_one({"email": request.email}, {"$set": {"password": new_hash}})
     
     return {"status": "ok"}
@@ -863,12 +1167,23 @@ class CreateApiKeyRequest(BaseModel):
 
 @app.get("/auth/api-keys")
 async def list_api_keys(email: str):
-    keys = await db.api_keys.find({"user_email": email}).to_list(length=100)
-    return {"keys": [{"id": str(k["_id"]), "name": k["name"], "created_at": k.get("created_at"), "prefix": k["key"][:8] + "..."} for k in keys]}
+    # Only the key prefix leaves the database
+    keys = await db.api_keys.aggregate([
+        {"$match": {"user_email": email}},
+        {"$sort": {"created_at": 1}},
+        {"$limit": 100},
+        {"$project": {
+            "_id": 0,
+            "id": {"$toString": "$_id"},
+            "name": 1,
+            "created_at": {"$ifNull": ["$created_at", None]},
+            "prefix": {"$concat": [{"$substrCP": ["$key", 0, 8]}, "..."]},
+        }},
+    ]).to_list(100)
+    return {"keys": keys}
 
 @app.post("/auth/api-keys")
 async def create_api_key(request: CreateApiKeyRequest):
-    from datetime import datetime
     key = f"sk-{uuid.uuid4().hex}"
     
     new_key = {
@@ -883,7 +1198,6 @@ async def create_api_key(request: CreateApiKeyRequest):
 
 @app.delete("/auth/api-keys/{key_id}")
 async def delete_api_key(key_id: str):
-    from bson import ObjectId
     await db.api_keys.delete_one({"_id": ObjectId(key_id)})
     return {"status": "ok"}
 
@@ -895,12 +1209,16 @@ class CreateWebhookRequest(BaseModel):
 
 @app.get("/auth/webhooks")
 async def list_webhooks(email: str):
-    hooks = await db.webhooks.find({"user_email": email}).to_list(length=100)
-    return {"webhooks": [{"id": str(h["_id"]), "url": h["url"], "events": h["events"]} for h in hooks]}
+    hooks = await db.webhooks.aggregate([
+        {"$match": {"user_email": email}},
+        {"$sort": {"created_at": 1}},
+        {"$limit": 100},
+        {"$project": {"_id": 0, "id": {"$toString": "$_id"}, "url": 1, "events": 1}},
+    ]).to_list(100)
+    return {"webhooks": hooks}
 
 @app.post("/auth/webhooks")
 async def create_webhook(request: CreateWebhookRequest):
-    from datetime import datetime
     new_hook = {
         "user_email": request.email,
         "url": request.url,
@@ -912,7 +1230,6 @@ async def create_webhook(request: CreateWebhookRequest):
 
 @app.delete("/auth/webhooks/{hook_id}")
 async def delete_webhook(hook_id: str):
-    from bson import ObjectId
     await db.webhooks.delete_one({"_id": ObjectId(hook_id)})
     return {"status": "ok"}
 
@@ -922,44 +1239,130 @@ def health():
 
 
 # Settings Endpoints
+# Ollama base URL -> (fetched_at, payload) for /settings/models
+_models_cache: Dict[str, tuple] = {}
+_models_lock = asyncio.Lock()
+MODELS_CACHE_TTL = 60
+
+
+async def _fetch_ollama_models(ollama_provider) -> dict:
+    models_list = await ollama_provider.fetch_tags()
+    return {
+        "models": [
+            {
+                "name": m.get("name", str(m)),
+                "size": m.get("size", 0),
+                "modified_at": str(m.get("modified_at", ""))
+            }
+            for m in models_list
+        ]
+    }
+
+
 @app.get("/settings/models")
 async def list_available_models():
-    """List all available models from Ollama."""
+    """List all available models from Ollama, cached for MODELS_CACHE_TTL seconds."""
+    # Use the provider registry to get Ollama provider
+    registry = rag.get_registry()
+    ollama_provider = registry.get_provider("ollama")
+    base_url = ollama_provider.base_url
+    
+    cached = _models_cache.get(base_url)
+    if cached and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+        return cached[1]
+    
+    # Concurrent misses share one upstream call
+    async with _models_lock:
+        cached = _models_cache.get(base_url)
+        if cached and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+            return cached[1]
+        try:
+            payload = await _fetch_ollama_models(ollama_provider)
+            _models_cache[base_url] = (time.monotonic(), payload)
+            return payload
+        except Exception as e:
+            print(f"Error listing Ollama models: {e}")
+            # Serve the last good list if we have one; otherwise an empty
+            # list so the frontend doesn't break
+            return cached[1] if cached else {"models": []}
+
+
+@app.delete("/settings/models/cache")
+async def clear_models_cache():
+    """Drop cached Ollama model lists, e.g. after pulling or removing a model."""
+    _models_cache.clear()
+    return {"status": "ok"}
+
+API_KEY_PROVIDERS = ["openai", "anthropic", "gemini"]
+
+# Settings fields, with API keys reduced to "is one set" flags inside Mongo so
+# the secrets themselves never leave the database
+_SETTINGS_PROJECTION = {
+    "_id": 0,
+    "chat_provider": 1,
+    "chat_model": 1,
+    "embedding_provider": 1,
+    "embedding_model": 1,
+    "ollama_url": 1,
+    "api_keys_configured": {
+        provider: {"$gt": [{"$strLenCP": {"$ifNull": [f"$api_keys.{provider}", ""]}}, 0]}
+        for provider in API_KEY_PROVIDERS
+    },
+}
+
+
+# Projected global settings document. While the change stream is open the
+# cached copy is trusted until the watcher drops it; otherwise it expires
+# after SETTINGS_CACHE_TTL seconds.
+_settings_cache: Dict[str, Any] = {"doc": None, "fetched_at": None, "watched": False}
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "10"))
+
+
+def _cache_settings(settings: Optional[dict]):
+    _settings_cache["doc"] = settings
+    _settings_cache["fetched_at"] = time.monotonic()
+
+
+def _invalidate_settings():
+    _settings_cache["fetched_at"] = None
+
+
+async def _load_settings() -> Optional[dict]:
+    """Return the projected global settings, reading Mongo only on a cache miss."""
+    fetched_at = _settings_cache["fetched_at"]
+    if fetched_at is not None and (
+        _settings_cache["watched"] or time.monotonic() - fetched_at < SETTINGS_CACHE_TTL
+    ):
+        return _settings_cache["doc"]
+    settings = await db.settings.find_one({"_id": "global"}, _SETTINGS_PROJECTION)
+    _cache_settings(settings)
+    return settings
+
+
+async def _watch_settings():
+    """Drop the cached settings whenever the global document changes."""
+    stream = db.settings.watch([{"$match": {"documentKey._id": "global"}}])
     try:
-        # Use the provider registry to get Ollama provider
-        registry = rag.get_registry()
-        ollama_provider = registry.get_provider("ollama")
-        
-        # Try to list models via httpx
-        import httpx
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{ollama_provider.base_url}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models_list = data.get("models", [])
-                return {
-                    "models": [
-                        {
-                            "name": m.get("name", str(m)),
-                            "size": m.get("size", 0),
-                            "modified_at": str(m.get("modified_at", ""))
-                        }
-                        for m in models_list
-                    ]
-                }
-            else:
-                return {"models": []}
+        # Opens the stream; raises on standalone servers without change streams
+        await stream.try_next()
+        _settings_cache["watched"] = True
+        _invalidate_settings()
+        async for _ in stream:
+            _invalidate_settings()
     except Exception as e:
-        print(f"Error listing Ollama models: {e}")
-        # Return empty list instead of error so frontend doesn't break
-        return {"models": []}
+        print(f"Settings change stream unavailable, caching for {SETTINGS_CACHE_TTL}s: {e}")
+    finally:
+        _settings_cache["watched"] = False
+        await stream.close()
+
 
 @app.get("/settings")
 async def get_settings():
     """Get current settings including provider configuration."""
-    settings = await db.settings.find_one({"_id": "global"})
+    settings = await _load_settings()
     
     # Get provider info
+    await rag.get_registry().get_provider("ollama").is_reachable()
     providers = rag.get_available_providers()
     
     if not settings:
@@ -978,10 +1381,7 @@ async def get_settings():
         "embedding_model": settings.get("embedding_model", "nomic-embed-text"),
         "ollama_url": settings.get("ollama_url", "http://ollama:11434"),
         "providers": providers,
-        "api_keys_configured": {
-            provider: bool(settings.get("api_keys", {}).get(provider))
-            for provider in ["openai", "anthropic", "gemini"]
-        }
+        "api_keys_configured": settings["api_keys_configured"]
     }
 
 
@@ -993,26 +1393,34 @@ class SettingsRequest(BaseModel):
     ollama_url: str = "http://ollama:11434"
 
 
+_provider_settings_lock = asyncio.Lock()
+
+
+async def _apply_provider_settings(request: SettingsRequest):
+    """Point the provider registry at the saved settings."""
+    async with _provider_settings_lock:
+        registry = rag.get_registry()
+        if request.ollama_url:
+            registry.get_provider("ollama").base_url = request.ollama_url
+        
+        rag.set_chat_provider(request.chat_provider, request.chat_model)
+        try:
+            rag.set_embedding_provider(request.embedding_provider, request.embedding_model)
+        except ValueError:
+            # Provider doesn't support embeddings, fallback to Ollama
+            rag.set_embedding_provider("ollama", request.embedding_model)
+
+
 @app.post("/settings")
-async def update_settings(request: SettingsRequest):
+async def update_settings(request: SettingsRequest, background_tasks: BackgroundTasks):
     """Update settings with provider configuration."""
-    # Configure Ollama URL if provided
-    if request.ollama_url:
-        registry = rag.get_registry()
-        ollama_provider = registry.get_provider("ollama")
-        ollama_provider.base_url = request.ollama_url
-    
-    # Configure providers in RAG module
-    rag.set_chat_provider(request.chat_provider, request.chat_model)
-    
-    try:
-        rag.set_embedding_provider(request.embedding_provider, request.embedding_model)
-    except ValueError as e:
-        # Provider doesn't support embeddings, fallback to Ollama
-        rag.set_embedding_provider("ollama", request.embedding_model)
+    known = rag.get_registry().PROVIDERS
+    for provider in (request.chat_provider, request.embedding_provider):
+        if provider not in known:
+            raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
     
-    # Save to database
-    await db.settings.update_one(
+    # Save to database and read back the stored settings in the same round-trip
+    settings = await db.settings.find_one_and_update(
         {"_id": "global"},
         {"$set": {
             "chat_provider": request.chat_provider,
@@ -1021,16 +1429,15 @@ async def update_settings(request: SettingsRequest):
             "embedding_model": request.embedding_model,
             "ollama_url": request.ollama_url
         }},
-        upsert=True
+        projection=_SETTINGS_PROJECTION,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
     
-    return {
-        "status": "ok",
-        "chat_provider": request.chat_provider,
-        "chat_model": request.chat_model,
-        "embedding_provider": request.embedding_provider,
-        "embedding_model": request.embedding_model
-    }
+    _cache_settings(settings)
+    # Mongo holds the truth; the registry is reconfigured after the response is sent
+    background_tasks.add_task(_apply_provider_settings, request)
+    return {"status": "ok", **settings}
 
 
 class ApiKeyRequest(BaseModel):
@@ -1041,7 +1448,7 @@ class ApiKeyRequest(BaseModel):
 @app.post("/settings/api-keys")
 async def set_api_key(request: ApiKeyRequest):
     """Set an API key for a provider."""
-    if request.provider not in ["openai", "anthropic", "gemini"]:
+    if request.provider not in API_KEY_PROVIDERS:
         raise HTTPException(status_code=400, detail=f"Unknown provider: {request.provider}")
     
     # Store in database (encrypted in production)
@@ -1050,6 +1457,7 @@ async def set_api_key(request: ApiKeyRequest):
         {"$set": {f"api_keys.{request.provider}": request.api_key}},
         upsert=True
     )
+    _invalidate_settings()
     
     # Update provider registry
     registry = rag.get_registry()
@@ -1066,32 +1474,57 @@ async def delete_api_key(provider: str):
         {"_id": "global"},
         {"$unset": {f"api_keys.{provider}": ""}}
     )
+    _invalidate_settings()
     return {"status": "ok"}
 
 
+PROVIDER_HEALTH_TIMEOUT = 5
+
+# Provider name -> probe currently running, shared by overlapping requests
+_health_inflight: Dict[str, asyncio.Task] = {}
+
+
 @app.get("/providers/health")
 async def check_providers_health():
     """Check health of all configured providers."""
     registry = rag.get_registry()
-    results = {}
+    provider_names = ["ollama", "openai", "gemini", "anthropic"]
     
-    for provider_name in ["ollama", "openai", "gemini", "anthropic"]:
+    async def check(provider_name: str) -> dict:
+        task = _health_inflight.get(provider_name)
+        if task is None:
+            task = asyncio.create_task(probe(provider_name))
+            _health_inflight[provider_name] = task
+            task.add_done_callback(lambda _: _health_inflight.pop(provider_name, None))
+        # Shielded so one client disconnecting doesn't cancel the probe for the others
+        return await asyncio.shield(task)
+    
+    async def probe(provider_name: str) -> dict:
         try:
             provider = registry.get_provider(provider_name)
-            results[provider_name] = await provider.health_check()
+            return await asyncio.wait_for(provider.cached_health_check(), timeout=PROVIDER_HEALTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {
+                "status": "error",
+                "message": f"Health check timed out after {PROVIDER_HEALTH_TIMEOUT}s",
+                "code": "timeout"
+            }
         except Exception as e:
-             results[provider_name] = {
+            return {
                 "status": "error",
                 "message": str(e),
                 "code": "system_error"
-             }
+            }
     
-    return results
+    # Providers are checked concurrently, so the slowest one bounds the latency
+    results = await asyncio.gather(*(check(name) for name in provider_names))
+    return dict(zip(provider_names, results))
 
 
 @app.get("/providers")
 async def list_providers():
     """List all available AI providers and their capabilities."""
+    await rag.get_registry().get_provider("ollama").is_reachable()
     return rag.get_available_providers()
 
 
@@ -1141,6 +1574,27 @@ async def tts_status():
         }
 
 
+def _tts_config(request: TTSRequest):
+    """Build the TTS config for the requested style."""
+    from src.csm.tts_service import TTSConfig
+    
+    # Configure based on style
+    if request.style == "conversational":
+        return TTSConfig(
+            speaker=request.speaker,
+            temperature=0.9,
+            topk=50,
+            style="conversational"
+        )
+    # reading mode (default)
+    return TTSConfig(
+        speaker=request.speaker,
+        temperature=0.7,
+        topk=30,
+        style="reading"
+    )
+
+
 @app.post("/tts/generate")
 async def generate_tts(request: TTSRequest, background_tasks: BackgroundTasks):
     """
@@ -1148,7 +1602,6 @@ async def generate_tts(request: TTSRequest, background_tasks: BackgroundTasks):
     
     Returns WAV audio file.
     """
-    from fastapi.responses import Response
     
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Text is required")
@@ -1157,27 +1610,12 @@ async def generate_tts(request: TTSRequest, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=400, detail="Text too long. Maximum 5000 characters.")
     
     try:
-        from src.csm.tts_service import get_tts_service, TTSConfig
+        from src.csm.tts_service import get_tts_service
         
         service = get_tts_service()
+        config = _tts_config(request)
         
-        # Configure based on style
-        if request.style == "conversational":
-            config = TTSConfig(
-                speaker=request.speaker,
-                temperature=0.9,
-                topk=50,
-                style="conversational"
-            )
-        else:  # reading mode (default)
-            config = TTSConfig(
-                speaker=request.speaker,
-                temperature=0.7,
-                topk=30,
-                style="reading"
-            )
-        
-        wav_bytes, sample_rate = service.generate_speech(request.text, config)
+        wav_bytes, sample_rate = await service.agenerate_speech(request.text, config)
         
         return Response(
             content=wav_bytes,
@@ -1197,6 +1635,41 @@ async def generate_tts(request: TTSRequest, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
 
 
+@app.post("/tts/stream")
+async def stream_tts(request: TTSRequest):
+    """
+    Stream text-to-speech audio as it is generated.
+    
+    Returns a WAV stream (header with unknown length, then 16-bit PCM).
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text is required")
+    
+    if len(request.text) > 5000:
+        raise HTTPException(status_code=400, detail="Text too long. Maximum 5000 characters.")
+    
+    try:
+        from src.csm.tts_service import get_tts_service
+        
+        service = get_tts_service()
+        config = _tts_config(request)
+    except ImportError as e:
+        raise HTTPException(
+            status_code=503, 
+            detail=f"TTS not available: {str(e)}. Please install CSM dependencies."
+        )
+    
+    # A sync iterator is run in Starlette's threadpool, keeping generation off the event loop
+    return StreamingResponse(
+        service.stream_speech(request.text, config),
+        media_type="audio/wav",
+        headers={
+            "Content-Disposition": "inline; filename=tts_output.wav",
+            "X-Sample-Rate": str(service.get_sample_rate())
+        }
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("src.main:app", host="0.0.0.0", port=8008, reload=True)
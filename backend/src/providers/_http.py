@@ -0,0 +1,30 @@
+"""
+Shared async HTTP client for the hosted API providers.
+OpenAI and Anthropic SDK clients are handed this one pool, so TLS
+connections stay warm across chat calls and health checks instead of
+every SDK client opening its own.
+"""
+
+from typing import Optional
+
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """Get or create the process-wide keep-alive client."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        )
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -6,13 +6,41 @@ Supports Claude 3 Opus, Sonnet, and Haiku models.
 import os
 from typing import List, Dict, Any, Optional, AsyncGenerator
 
+import anthropic
 from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
 from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
+from . import _http
 from .base import BaseProvider, ProviderCapabilities
 
 
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage, "system": SystemMessage}
+
+_CAPABILITIES = ProviderCapabilities(
+    supports_chat=True,
+    supports_streaming=True,
+    supports_embeddings=False,  # Anthropic doesn't provide embeddings
+    supports_vision=True,
+    supports_function_calling=True,
+    max_context_length=200000,  # Claude supports 200K tokens
+    available_chat_models=(
+        # Claude 4.5 (Latest per LangChain docs)
+        "claude-sonnet-4-5-20250929",
+        "claude-haiku-4-5-20251001",
+        # Claude 3.5
+        "claude-3-5-sonnet-latest",
+        "claude-3-5-haiku-latest",
+        # Claude 3
+        "claude-3-opus-latest",
+        "claude-3-sonnet-20240229",
+        "claude-3-haiku-20240307",
+    ),
+    available_embedding_models=()  # No embeddings
+)
+
+
 class AnthropicProvider(BaseProvider):
     """Provider for Anthropic Claude models."""
     
@@ -28,35 +56,16 @@ class AnthropicProvider(BaseProvider):
     
     @property
     def capabilities(self) -> ProviderCapabilities:
-        return ProviderCapabilities(
-            supports_chat=True,
-            supports_streaming=True,
-            supports_embeddings=False,  # Anthropic doesn't provide embeddings
-            supports_vision=True,
-            supports_function_calling=True,
-            max_context_length=200000,  # Claude supports 200K tokens
-            available_chat_models=[
-                # Claude 4.5 (Latest per LangChain docs)
-                "claude-sonnet-4-5-20250929",
-                "claude-haiku-4-5-20251001",
-                # Claude 3.5
-                "claude-3-5-sonnet-latest",
-                "claude-3-5-haiku-latest",
-                # Claude 3
-                "claude-3-opus-latest",
-                "claude-3-sonnet-20240229",
-                "claude-3-haiku-20240307",
-            ],
-            available_embedding_models=[]  # No embeddings
-        )
+        return _CAPABILITIES
     
     def get_chat_model(self, model_name: Optional[str] = None) -> BaseChatModel:
         """Get a LangChain ChatAnthropic instance."""
-        return ChatAnthropic(
-            model=model_name or self._chat_model,
+        model = model_name or self._chat_model
+        return self._cached_model("chat", model, lambda: ChatAnthropic(
+            model=model,
             anthropic_api_key=self.api_key,
             temperature=0.7,
-        )
+        ))
     
     def get_embeddings(self, model_name: Optional[str] = None) -> Embeddings:
         """Anthropic doesn't provide embeddings. Raises NotImplementedError."""
@@ -67,7 +76,7 @@ class AnthropicProvider(BaseProvider):
     
     async def list_models(self) -> List[str]:
         """List available Claude models."""
-        return self.capabilities.available_chat_models
+        return list(_CAPABILITIES.available_chat_models)
     
     async def stream_chat(
         self,
@@ -76,19 +85,13 @@ class AnthropicProvider(BaseProvider):
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Stream a chat response from Claude."""
-        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-        
-        # Convert dict messages to LangChain format
-        lc_messages = []
-        for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "user":
-                lc_messages.append(HumanMessage(content=content))
-            elif role == "assistant":
-                lc_messages.append(AIMessage(content=content))
-            elif role == "system":
-                lc_messages.append(SystemMessage(content=content))
+        # Convert dict messages to LangChain format; unknown roles are dropped
+        message_types = _MESSAGE_TYPES
+        lc_messages = [
+            message_types[role](content=msg.get("content", ""))
+            for msg in messages
+            if (role := msg.get("role", "user")) in message_types
+        ]
         
         model = self.get_chat_model(model_name)
         
@@ -102,8 +105,7 @@ class AnthropicProvider(BaseProvider):
             return {"status": "error", "message": "API key not configured", "code": "missing_api_key"}
             
         try:
-            import anthropic
-            client = anthropic.AsyncAnthropic(api_key=self.api_key)
+            client = anthropic.AsyncAnthropic(api_key=self.api_key, http_client=_http.get_shared_client())
             # Anthropic doesn't have a cheap list_models API. 
             # We must make a minimal call, e.g. completion with max_tokens=1
             await client.messages.create(
@@ -3,14 +3,16 @@ Abstract base class for AI providers.
 Defines the interface that all providers must implement.
 """
 
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Generator, Optional, AsyncGenerator
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Generator, Optional, AsyncGenerator, Tuple
 from langchain_core.language_models import BaseChatModel
 from langchain_core.embeddings import Embeddings
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ProviderCapabilities:
     """Describes what a provider can do."""
     supports_chat: bool = True
@@ -19,8 +21,8 @@ class ProviderCapabilities:
     supports_vision: bool = False
     supports_function_calling: bool = False
     max_context_length: int = 4096
-    available_chat_models: List[str] = field(default_factory=list)
-    available_embedding_models: List[str] = field(default_factory=list)
+    available_chat_models: Tuple[str, ...] = ()
+    available_embedding_models: Tuple[str, ...] = ()
 
 
 class BaseProvider(ABC):
@@ -29,11 +31,21 @@ class BaseProvider(ABC):
     Each provider (Ollama, OpenAI, Gemini, Claude) must implement this interface.
     """
     
+    # Texts per embedding request, and how many requests embed_documents keeps in flight
+    EMBED_BATCH_SIZE = 64
+    EMBED_CONCURRENCY = 8
+    # Seconds a health_check result is reused by cached_health_check
+    HEALTH_TTL = 30
+    
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         self.api_key = api_key
         self.base_url = base_url
         self._chat_model: Optional[str] = None
         self._embedding_model: Optional[str] = None
+        self._health_cache: Optional[Tuple[float, tuple, Dict[str, Any]]] = None
+        # (kind, model name) -> LangChain chat/embeddings instance, valid for _model_cache_owner
+        self._model_cache: Dict[Tuple[str, str], Any] = {}
+        self._model_cache_owner: Optional[tuple] = None
     
     @property
     @abstractmethod
@@ -73,6 +85,22 @@ class BaseProvider(ABC):
         """
         pass
     
+    def _cached_model(self, kind: str, model_name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return a cached LangChain model object, building it with `factory` on a miss.
+        Reusing instances keeps their HTTP clients and connection pools warm; the
+        cache is dropped when the API key or base URL changes.
+        """
+        owner = (self.api_key, self.base_url)
+        if self._model_cache_owner != owner:
+            self._model_cache.clear()
+            self._model_cache_owner = owner
+        key = (kind, model_name)
+        instance = self._model_cache.get(key)
+        if instance is None:
+            instance = self._model_cache[key] = factory()
+        return instance
+    
     @abstractmethod
     async def list_models(self) -> List[str]:
         """List available models from the provider."""
@@ -115,16 +143,28 @@ class BaseProvider(ABC):
     async def embed_documents(self, texts: List[str], model_name: Optional[str] = None) -> List[List[float]]:
         """
         Generate embeddings for multiple texts.
+        Texts are sent in EMBED_BATCH_SIZE batches, EMBED_CONCURRENCY at a time.
         
         Args:
             texts: List of texts to embed.
             model_name: Specific model to use.
             
         Returns:
-            List of embedding vectors.
+            List of embedding vectors, in the order of `texts`.
         """
         embeddings = self.get_embeddings(model_name)
-        return await embeddings.aembed_documents(texts)
+        size = self.EMBED_BATCH_SIZE
+        if len(texts) <= size:
+            return await embeddings.aembed_documents(texts)
+        
+        sem = asyncio.Semaphore(self.EMBED_CONCURRENCY)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with sem:
+                return await embeddings.aembed_documents(batch)
+        
+        results = await asyncio.gather(*(embed_batch(texts[i:i + size]) for i in range(0, len(texts), size)))
+        return [vector for batch in results for vector in batch]
     
     def set_chat_model(self, model_name: str):
         """Set the default chat model."""
@@ -146,5 +186,22 @@ class BaseProvider(ABC):
         """
         pass
     
+    async def cached_health_check(self) -> Dict[str, Any]:
+        """
+        Run health_check, reusing the result for HEALTH_TTL seconds.
+        The cache is dropped when the API key or base URL changes.
+        """
+        key = (self.api_key, self.base_url)
+        cached = self._health_cache
+        if cached and cached[1] == key and time.monotonic() - cached[0] < self.HEALTH_TTL:
+            return cached[2]
+        result = await self.health_check()
+        self._health_cache = (time.monotonic(), key, result)
+        return result
+    
+    async def aclose(self):
+        """Release network resources held by the provider."""
+        pass
+    
     def __repr__(self):
         return f"<{self.__class__.__name__}(configured={self.is_configured()})>"
@@ -14,20 +14,48 @@ from langchain_core.embeddings import Embeddings
 from .base import BaseProvider, ProviderCapabilities
 
 
+# Chat roles -> Gemini content roles; system messages become the system instruction
+_GEMINI_ROLES = {"user": "user", "assistant": "model"}
+
+_CAPABILITIES = ProviderCapabilities(
+    supports_chat=True,
+    supports_streaming=True,
+    supports_embeddings=True,
+    supports_vision=True,
+    supports_function_calling=True,
+    max_context_length=1048576,  # 1M tokens
+    available_chat_models=(
+        "gemini-2.5-pro",
+        "gemini-3-flash-preview",
+        "gemini-3-pro-preview"
+    ),
+    available_embedding_models=(
+        "gemini-embedding-001",
+    )
+)
+
+
+# embed_content accepts at most 100 texts per request
+GEMINI_EMBED_BATCH = 100
+
+
 class GeminiEmbeddings(Embeddings):
     """Embeddings wrapper using google-genai SDK."""
     
-    def __init__(self, api_key: str, model: str = "gemini-embedding-001"):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key: str, model: str = "gemini-embedding-001", client: Optional[genai.Client] = None):
+        self.client = client or genai.Client(api_key=api_key)
         self.model = model
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents."""
-        response = self.client.models.embed_content(
-            model=self.model,
-            contents=texts,
-        )
-        return [e.values for e in response.embeddings]
+        """Embed a list of documents, GEMINI_EMBED_BATCH texts per request."""
+        vectors = []
+        for start in range(0, len(texts), GEMINI_EMBED_BATCH):
+            response = self.client.models.embed_content(
+                model=self.model,
+                contents=texts[start:start + GEMINI_EMBED_BATCH],
+            )
+            vectors.extend(e.values for e in response.embeddings)
+        return vectors
     
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query."""
@@ -36,6 +64,25 @@ class GeminiEmbeddings(Embeddings):
             contents=text,
         )
         return response.embeddings[0].values
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents without blocking the event loop."""
+        vectors = []
+        for start in range(0, len(texts), GEMINI_EMBED_BATCH):
+            response = await self.client.aio.models.embed_content(
+                model=self.model,
+                contents=texts[start:start + GEMINI_EMBED_BATCH],
+            )
+            vectors.extend(e.values for e in response.embeddings)
+        return vectors
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a single query without blocking the event loop."""
+        response = await self.client.aio.models.embed_content(
+            model=self.model,
+            contents=text,
+        )
+        return response.embeddings[0].values
 
 
 class GeminiProvider(BaseProvider):
@@ -43,22 +90,25 @@ class GeminiProvider(BaseProvider):
     
     DEFAULT_CHAT_MODEL = "gemini-1.5-flash"
     DEFAULT_EMBEDDING_MODEL = "gemini-embedding-001"
+    EMBED_BATCH_SIZE = GEMINI_EMBED_BATCH
     
     def __init__(self, api_key: Optional[str] = None):
         super().__init__(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
         self._chat_model = self.DEFAULT_CHAT_MODEL
         self._embedding_model = self.DEFAULT_EMBEDDING_MODEL
         self._client: Optional[genai.Client] = None
+        self._client_key: Optional[str] = None
     
     def _get_client(self) -> genai.Client:
-        """Get or create the Google GenAI client."""
-        if self._client is None:
-            self._client = genai.Client(api_key=self.api_key)
+        """Get the Google GenAI client, recreating it if the API key changed."""
+        if self._client is None or self._client_key != self.api_key:
+            self._refresh_client()
         return self._client
     
     def _refresh_client(self):
         """Force refresh of the client (when API key changes)."""
         self._client = genai.Client(api_key=self.api_key)
+        self._client_key = self.api_key
     
     @property
     def name(self) -> str:
@@ -66,46 +116,34 @@ class GeminiProvider(BaseProvider):
     
     @property
     def capabilities(self) -> ProviderCapabilities:
-        return ProviderCapabilities(
-            supports_chat=True,
-            supports_streaming=True,
-            supports_embeddings=True,
-            supports_vision=True,
-            supports_function_calling=True,
-            max_context_length=1048576,  # 1M tokens
-            available_chat_models=[
-                "gemini-2.5-pro",
-                "gemini-3-flash-preview",
-                "gemini-3-pro-preview"
-            ],
-            available_embedding_models=[
-                "gemini-embedding-001",
-            ]
-        )
+        return _CAPABILITIES
     
     def get_chat_model(self, model_name: Optional[str] = None) -> BaseChatModel:
         """Get a LangChain ChatGoogleGenerativeAI instance."""
         try:
             from langchain_google_genai import ChatGoogleGenerativeAI
-            return ChatGoogleGenerativeAI(
-                model=model_name or self._chat_model,
+            model = model_name or self._chat_model
+            return self._cached_model("chat", model, lambda: ChatGoogleGenerativeAI(
+                model=model,
                 google_api_key=self.api_key,
                 temperature=0.7,
                 convert_system_message_to_human=True
-            )
+            ))
         except ImportError:
             raise ImportError("langchain-google-genai is required for get_chat_model")
     
     def get_embeddings(self, model_name: Optional[str] = None) -> Embeddings:
         """Get embeddings using google-genai SDK."""
-        return GeminiEmbeddings(
+        model = model_name or self._embedding_model
+        return self._cached_model("embeddings", model, lambda: GeminiEmbeddings(
             api_key=self.api_key,
-            model=model_name or self._embedding_model
-        )
+            model=model,
+            client=self._get_client()
+        ))
     
     async def list_models(self) -> List[str]:
         """List available Gemini models."""
-        return self.capabilities.available_chat_models
+        return list(_CAPABILITIES.available_chat_models)
     
     async def stream_chat(
         self,
@@ -115,27 +153,22 @@ class GeminiProvider(BaseProvider):
     ) -> AsyncGenerator[str, None]:
         """Stream a chat response from Gemini using google-genai SDK."""
         model = model_name or self._chat_model
-        self._refresh_client()
         client = self._get_client()
         
         # Build contents list and extract system instruction
         contents = []
         system_instruction = None
         
+        roles = _GEMINI_ROLES
         for msg in messages:
             role = msg.get("role", "user")
             content = msg.get("content", "")
             
             if role == "system":
                 system_instruction = content
-            elif role == "user":
-                contents.append(types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=content)]
-                ))
-            elif role == "assistant":
+            elif role in roles:
                 contents.append(types.Content(
-                    role="model",
+                    role=roles[role],
                     parts=[types.Part.from_text(text=content)]
                 ))
         
@@ -178,10 +211,9 @@ class GeminiProvider(BaseProvider):
             
         try:
             client = self._get_client()
-            # Simple metadata query to list models
-            # We use an async iterator if available or sync fallback
-            # but list() on the pager shouldn't cost money
-            list(client.models.list(config={"page_size": 1}))
+            # Fetch a single page of models; stop before the pager walks the rest
+            async for _ in await client.aio.models.list(config={"page_size": 1}):
+                break
             return {"status": "ok", "message": "Gemini is healthy"}
         except Exception as e:
             return {"status": "error", "message": str(e), "code": "api_error"}
@@ -4,8 +4,10 @@ Connects to a local or remote Ollama instance.
 """
 
 import os
+import time
 from typing import List, Dict, Any, Optional, AsyncGenerator
 import httpx
+import orjson
 
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain_core.language_models import BaseChatModel
@@ -14,18 +16,56 @@ from langchain_core.embeddings import Embeddings
 from .base import BaseProvider, ProviderCapabilities
 
 
+_CAPABILITIES = ProviderCapabilities(
+    supports_chat=True,
+    supports_streaming=True,
+    supports_embeddings=True,
+    supports_vision=True,  # Some Ollama models support vision
+    supports_function_calling=False,
+    max_context_length=8192,
+)
+
+
+def _message_content(line: bytes) -> str:
+    """Extract message.content from one NDJSON line of /api/chat output."""
+    if b'"content"' not in line:
+        return ""
+    try:
+        return orjson.loads(line).get("message", {}).get("content", "")
+    except orjson.JSONDecodeError:
+        return ""
+
+
 class OllamaProvider(BaseProvider):
     """Provider for Ollama (local LLMs)."""
     
     DEFAULT_HOST = "http://localhost:11434"
     DEFAULT_CHAT_MODEL = "llama3"
     DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+    REACHABILITY_TTL = 30
+    EMBED_BATCH_SIZE = 16
     
     def __init__(self, base_url: Optional[str] = None):
         super().__init__(base_url=base_url or os.getenv("OLLAMA_HOST", self.DEFAULT_HOST))
         self._chat_model = self.DEFAULT_CHAT_MODEL
         self._embedding_model = self.DEFAULT_EMBEDDING_MODEL
-        self._capabilities = None
+        self._client: Optional[httpx.AsyncClient] = None
+        # (base_url, checked_at, reachable) from the last is_reachable() probe
+        self._reachability: Optional[tuple] = None
+    
+    def _http(self) -> httpx.AsyncClient:
+        """Shared keep-alive client. Requests use absolute URLs, so base_url can change freely."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            )
+        return self._client
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     @property
     def name(self) -> str:
@@ -33,40 +73,35 @@ class OllamaProvider(BaseProvider):
     
     @property
     def capabilities(self) -> ProviderCapabilities:
-        if self._capabilities is None:
-            self._capabilities = ProviderCapabilities(
-                supports_chat=True,
-                supports_streaming=True,
-                supports_embeddings=True,
-                supports_vision=True,  # Some Ollama models support vision
-                supports_function_calling=False,
-                max_context_length=8192,
-            )
-        return self._capabilities
+        return _CAPABILITIES
     
     def get_chat_model(self, model_name: Optional[str] = None) -> BaseChatModel:
         """Get a LangChain ChatOllama instance."""
-        return ChatOllama(
-            model=model_name or self._chat_model,
+        model = model_name or self._chat_model
+        return self._cached_model("chat", model, lambda: ChatOllama(
+            model=model,
             base_url=self.base_url,
             temperature=0.7,
-        )
+        ))
     
     def get_embeddings(self, model_name: Optional[str] = None) -> Embeddings:
         """Get a LangChain OllamaEmbeddings instance."""
-        return OllamaEmbeddings(
-            model=model_name or self._embedding_model,
+        model = model_name or self._embedding_model
+        return self._cached_model("embeddings", model, lambda: OllamaEmbeddings(
+            model=model,
             base_url=self.base_url,
-        )
+        ))
+    
+    async def fetch_tags(self) -> List[Dict[str, Any]]:
+        """Return the raw model entries from /api/tags. Raises on HTTP or connection errors."""
+        response = await self._http().get(f"{self.base_url}/api/tags", timeout=5.0)
+        response.raise_for_status()
+        return response.json().get("models", [])
     
     async def list_models(self) -> List[str]:
         """List available models from Ollama."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags")
-                if response.status_code == 200:
-                    data = response.json()
-                    return [model["name"] for model in data.get("models", [])]
+            return [model["name"] for model in await self.fetch_tags()]
         except Exception as e:
             print(f"Error listing Ollama models: {e}")
         return []
@@ -78,49 +113,60 @@ class OllamaProvider(BaseProvider):
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Stream a chat response from Ollama."""
-        import json
-        
         model = model_name or self._chat_model
-        payload = {
+        # Encode with orjson up front instead of letting httpx run the stdlib encoder
+        body = orjson.dumps({
             "model": model,
             "messages": messages,
             "stream": True,
             **kwargs
-        }
+        })
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/api/chat",
-                json=payload
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            content = data.get("message", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
+        async with self._http().stream(
+            "POST",
+            f"{self.base_url}/api/chat",
+            content=body,
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            # NDJSON: split raw bytes on newlines and only parse lines that carry content
+            buffer = b""
+            async for chunk in response.aiter_bytes():
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    content = _message_content(line)
+                    if content:
+                        yield content
+            content = _message_content(buffer)
+            if content:
+                yield content
     
     async def health_check(self) -> Dict[str, Any]:
         """Check if Ollama servier is reachable."""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/api/tags")
-                if response.status_code == 200:
-                    return {"status": "ok", "message": "Ollama is reachable"}
-                else:
-                    return {"status": "error", "message": f"Ollama returned {response.status_code}", "code": "http_error"}
+            response = await self._http().get(f"{self.base_url}/api/tags", timeout=5.0)
+            if response.status_code == 200:
+                return {"status": "ok", "message": "Ollama is reachable"}
+            else:
+                return {"status": "error", "message": f"Ollama returned {response.status_code}", "code": "http_error"}
         except Exception as e:
             return {"status": "error", "message": f"Could not connect to Ollama: {e}", "code": "connection_error"}
 
-    def is_configured(self) -> bool:
-        """Check if Ollama is reachable."""
+    async def is_reachable(self) -> bool:
+        """Check if Ollama answers, caching the result for REACHABILITY_TTL seconds."""
+        checked = self._reachability
+        if checked and checked[0] == self.base_url and time.monotonic() - checked[1] < self.REACHABILITY_TTL:
+            return checked[2]
         try:
-            import requests
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
-            return response.status_code == 200
-        except:
-            return False
+            response = await self._http().get(f"{self.base_url}/api/tags", timeout=2.0)
+            reachable = response.status_code == 200
+        except Exception:
+            reachable = False
+        self._reachability = (self.base_url, time.monotonic(), reachable)
+        return reachable
+
+    def is_configured(self) -> bool:
+        """Last known reachability from is_reachable(); Ollama needs no API key."""
+        checked = self._reachability
+        if checked and checked[0] == self.base_url:
+            return checked[2]
+        return True
@@ -6,18 +6,58 @@ Supports GPT-4o, GPT-4, GPT-3.5, and embedding models.
 import os
 from typing import List, Dict, Any, Optional, AsyncGenerator
 
+import openai
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.language_models import BaseChatModel
 from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
+from . import _http
 from .base import BaseProvider, ProviderCapabilities
 
 
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage, "system": SystemMessage}
+
+_CAPABILITIES = ProviderCapabilities(
+    supports_chat=True,
+    supports_streaming=True,
+    supports_embeddings=True,
+    supports_vision=True,
+    supports_function_calling=True,
+    max_context_length=128000,  # GPT-4 supports 128K tokens
+    available_chat_models=(
+        # GPT-5 (Latest)
+        "gpt-5",
+        "gpt-5-nano",
+        # GPT-4.1 (Current)
+        "gpt-4.1",
+        "gpt-4.1-mini",
+        # GPT-4o
+        "gpt-4o",
+        "gpt-4o-mini",
+        # Older
+        "gpt-4-turbo",
+        "gpt-4",
+        "gpt-3.5-turbo",
+        # Reasoning models
+        "o1",
+        "o1-mini",
+    ),
+    available_embedding_models=(
+        "text-embedding-3-small",
+        "text-embedding-3-large",
+        "text-embedding-ada-002",
+    )
+)
+
+
 class OpenAIProvider(BaseProvider):
     """Provider for OpenAI models."""
     
     DEFAULT_CHAT_MODEL = "gpt-4.1-mini"  # Latest per LangChain docs
     DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+    # Keep parallel embedding requests under typical tier rate limits
+    EMBED_CONCURRENCY = 4
     
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         super().__init__(
@@ -33,63 +73,37 @@ class OpenAIProvider(BaseProvider):
     
     @property
     def capabilities(self) -> ProviderCapabilities:
-        return ProviderCapabilities(
-            supports_chat=True,
-            supports_streaming=True,
-            supports_embeddings=True,
-            supports_vision=True,
-            supports_function_calling=True,
-            max_context_length=128000,  # GPT-4 supports 128K tokens
-            available_chat_models=[
-                # GPT-5 (Latest)
-                "gpt-5",
-                "gpt-5-nano",
-                # GPT-4.1 (Current)
-                "gpt-4.1",
-                "gpt-4.1-mini",
-                # GPT-4o
-                "gpt-4o",
-                "gpt-4o-mini",
-                # Older
-                "gpt-4-turbo",
-                "gpt-4",
-                "gpt-3.5-turbo",
-                # Reasoning models
-                "o1",
-                "o1-mini",
-            ],
-            available_embedding_models=[
-                "text-embedding-3-small",
-                "text-embedding-3-large",
-                "text-embedding-ada-002",
-            ]
-        )
+        return _CAPABILITIES
     
     def get_chat_model(self, model_name: Optional[str] = None) -> BaseChatModel:
         """Get a LangChain ChatOpenAI instance."""
+        model = model_name or self._chat_model
         kwargs = {
-            "model": model_name or self._chat_model,
+            "model": model,
             "openai_api_key": self.api_key,
             "temperature": 0.7,
+            "http_async_client": _http.get_shared_client(),
         }
         if self.base_url:
             kwargs["openai_api_base"] = self.base_url
-        return ChatOpenAI(**kwargs)
+        return self._cached_model("chat", model, lambda: ChatOpenAI(**kwargs))
     
     def get_embeddings(self, model_name: Optional[str] = None) -> Embeddings:
         """Get a LangChain OpenAIEmbeddings instance."""
+        model = model_name or self._embedding_model
         kwargs = {
-            "model": model_name or self._embedding_model,
+            "model": model,
             "openai_api_key": self.api_key,
+            "http_async_client": _http.get_shared_client(),
         }
         if self.base_url:
             kwargs["openai_api_base"] = self.base_url
-        return OpenAIEmbeddings(**kwargs)
+        return self._cached_model("embeddings", model, lambda: OpenAIEmbeddings(**kwargs))
     
     async def list_models(self) -> List[str]:
         """List available OpenAI models."""
         # OpenAI has a models list API, but for simplicity return known models
-        return self.capabilities.available_chat_models
+        return list(_CAPABILITIES.available_chat_models)
     
     async def stream_chat(
         self,
@@ -98,19 +112,13 @@ class OpenAIProvider(BaseProvider):
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Stream a chat response from OpenAI."""
-        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-        
-        # Convert dict messages to LangChain format
-        lc_messages = []
-        for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "user":
-                lc_messages.append(HumanMessage(content=content))
-            elif role == "assistant":
-                lc_messages.append(AIMessage(content=content))
-            elif role == "system":
-                lc_messages.append(SystemMessage(content=content))
+        # Convert dict messages to LangChain format; unknown roles are dropped
+        message_types = _MESSAGE_TYPES
+        lc_messages = [
+            message_types[role](content=msg.get("content", ""))
+            for msg in messages
+            if (role := msg.get("role", "user")) in message_types
+        ]
         
         model = self.get_chat_model(model_name)
         
@@ -124,10 +132,17 @@ class OpenAIProvider(BaseProvider):
             return {"status": "error", "message": "API key not configured", "code": "missing_api_key"}
             
         try:
-            import openai
-            client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
-            # Listing models is a good way to check auth without spending tokens
-            await client.models.list()
+            # The SDK client is cached with the LangChain models, so it is rebuilt only when credentials change
+            client = self._cached_model("sdk", "", lambda: openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=_http.get_shared_client(),
+            ))
+            # Fetching one model checks auth with a far smaller response than listing them all
+            await client.models.retrieve(self._chat_model)
+            return {"status": "ok", "message": "OpenAI is healthy"}
+        except openai.NotFoundError:
+            # Authenticated, but this endpoint doesn't serve the chat model under that name
             return {"status": "ok", "message": "OpenAI is healthy"}
         except Exception as e:
             error_msg = str(e)
@@ -4,7 +4,8 @@ Manages provider instances and configuration.
 """
 
 import os
-from typing import Dict, Optional, Type
+from typing import Dict, Optional, Tuple, Type
+from . import _http
 from .base import BaseProvider
 from .ollama import OllamaProvider
 from .gemini import GeminiProvider
@@ -32,6 +33,8 @@ class ProviderRegistry:
         self._chat_model: Optional[str] = None
         self._embedding_provider_name: str = "ollama"  # Default
         self._embedding_model: Optional[str] = None
+        # (configured flag per provider, list_providers result)
+        self._providers_cache: Optional[Tuple[tuple, Dict[str, dict]]] = None
     
     def get_provider(self, name: str) -> BaseProvider:
         """
@@ -91,13 +94,22 @@ class ProviderRegistry:
         return self._embedding_model
     
     def list_providers(self) -> Dict[str, dict]:
-        """List all available providers with their status."""
+        """
+        List all available providers with their status.
+        The result only changes when a provider's configured state does, so it is
+        rebuilt only then; callers must not mutate it.
+        """
+        configured = tuple(self.get_provider(name).is_configured() for name in self.PROVIDERS)
+        cached = self._providers_cache
+        if cached is not None and cached[0] == configured:
+            return cached[1]
+        
         result = {}
-        for name, cls in self.PROVIDERS.items():
+        for name, is_configured in zip(self.PROVIDERS, configured):
             provider = self.get_provider(name)
             result[name] = {
                 "name": name,
-                "configured": provider.is_configured(),
+                "configured": is_configured,
                 "capabilities": {
                     "chat": provider.capabilities.supports_chat,
                     "streaming": provider.capabilities.supports_streaming,
@@ -108,8 +120,15 @@ class ProviderRegistry:
                 "available_chat_models": provider.capabilities.available_chat_models,
                 "available_embedding_models": provider.capabilities.available_embedding_models,
             }
+        self._providers_cache = (configured, result)
         return result
     
+    async def aclose(self):
+        """Close every provider that has been created, and the shared HTTP client."""
+        for provider in self._instances.values():
+            await provider.aclose()
+        await _http.aclose()
+    
     def configure_from_settings(self, settings: dict):
         """
         Configure providers from settings dict.
@@ -4,23 +4,32 @@ Integrates with the Provider system and LangChain for advanced RAG.
 Maintains backward compatibility with existing API.
 """
 
+import asyncio
+import logging
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+import numpy as np
 import torch
-import chromadb
 import json
 from tqdm import tqdm
-from faster_whisper import WhisperModel
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from typing import List, Dict, Any, Generator, Optional, Tuple, AsyncGenerator
 
 
 from .providers.registry import get_registry, ProviderRegistry
-from .chains.rag_chain import RAGChain, create_rag_chain
+from .chains.rag_chain import RAGChain, create_rag_chain, get_chroma_client, get_hnsw_metadata
+from .chains import _cache
+from .chains._embedding_store import embed_cached
 
 
 __all__ = ['get_registry', 'get_rag_chain', 'process_document', 'transcribe_audio', 
@@ -28,18 +37,32 @@ __all__ = ['get_registry', 'get_rag_chain', 'process_document', 'transcribe_audi
            'set_embedding_provider', 'list_provider_models', 'delete_source_documents']
 
 
+logger = logging.getLogger(__name__)
+
+
 CHROMA_HOST = os.getenv("CHROMA_HOST", "chromadb")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", 8000))
 
 
-chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-collection = chroma_client.get_or_create_collection(name="notebook_docs")
+chroma_client = get_chroma_client(CHROMA_HOST, CHROMA_PORT)
+collection = chroma_client.get_or_create_collection(name="notebook_docs", metadata=get_hnsw_metadata())
 
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 compute_type = "float16" if device == "cuda" else "int8"
 whisper_model = None
 
+# Replay identical chat requests from memory instead of calling the model again.
+# Off by default: responses are sampled, so a re-asked question normally gets a fresh answer.
+# Done here rather than with LangChain's set_llm_cache, which does not apply to astream.
+RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "0") == "1"
+
+# Concurrent transcribe() calls the Whisper model can serve in parallel
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 2))
+
+# On GPU, speech segments within a file are decoded in batches of this size
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", 16))
+
 
 _rag_chain: Optional[RAGChain] = None
 
@@ -56,70 +79,168 @@ def get_rag_chain() -> RAGChain:
 
 
 def get_whisper_model():
-    """Lazy load Whisper model."""
+    """Lazy load Whisper model, wrapped in a batched pipeline on GPU."""
     global whisper_model
     if whisper_model is None:
-        print(f"Loading Whisper model on {device}...")
-        whisper_model = WhisperModel("small", device=device, compute_type=compute_type)
+        logger.info("Loading Whisper model on %s...", device)
+        # On CPU, split the cores between the workers instead of oversubscribing them
+        cpu_threads = 0 if device == "cuda" else max(1, (os.cpu_count() or 1) // TRANSCRIBE_WORKERS)
+        model = WhisperModel(
+            "small",
+            device=device,
+            compute_type=compute_type,
+            num_workers=TRANSCRIBE_WORKERS,
+            cpu_threads=cpu_threads,
+        )
+        whisper_model = BatchedInferencePipeline(model=model) if device == "cuda" else model
     return whisper_model
 
 
-def get_embeddings(text: str) -> List[float]:
+async def aget_embeddings(text: str) -> List[float]:
     """
-    Generate embeddings using the configured provider.
+    Generate embeddings using the configured provider, without blocking the event loop.
     Falls back to Ollama if provider not available.
     """
     try:
         registry = get_registry()
         embedding_provider = registry.get_embedding_provider()
         embeddings = embedding_provider.get_embeddings()
-        # Use sync embed via run_in_executor or direct call
-        return embeddings.embed_query(text)
+        # Same key as RAGChain._embed_query, so both paths share cached query vectors
+        return await _cache.aembed_query_cached(
+            type(embeddings).__name__, getattr(embeddings, "model", None), text, embeddings.aembed_query
+        )
     except Exception as e:
-        print(f"Error generating embeddings via provider: {e}")
+        logger.warning("Error generating embeddings via provider: %s", e)
         # Fallback to direct Ollama call
         try:
             import ollama
             OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
-            client = ollama.Client(host=OLLAMA_HOST)
-            response = client.embeddings(model="nomic-embed-text", prompt=text)
+            client = ollama.AsyncClient(host=OLLAMA_HOST)
+            response = await client.embeddings(model="nomic-embed-text", prompt=text)
             return response["embedding"]
         except Exception as e2:
-            print(f"Fallback embedding also failed: {e2}")
+            logger.error("Fallback embedding also failed: %s", e2)
             return []
 
 
-def transcribe_audio(file_path: str) -> str:
-    model = get_whisper_model()
+def embed_documents_concurrent(embeddings, texts: List[str], batch_size: int = 16, max_in_flight: int = 5) -> List[List[float]]:
+    """
+    Embed texts in batches, running up to max_in_flight requests at once.
+    
+    Args:
+        embeddings: A LangChain Embeddings instance
+        texts: Texts to embed
+        batch_size: Texts per request
+        max_in_flight: Concurrent requests
+    
+    Returns:
+        Embedding vectors in the order of `texts`.
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    if len(batches) <= 1:
+        return embeddings.embed_documents(texts) if texts else []
     
-    # Get audio duration for progress bar
-    import subprocess
+    def embed(batch: List[str]) -> List[List[float]]:
+        # Jitter so parallel requests don't reach rate-limited APIs in lockstep
+        time.sleep(random.uniform(0, 0.05))
+        return embeddings.embed_documents(batch)
+    
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        return [vector for batch in pool.map(embed, batches) for vector in batch]
+
+
+def get_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Embed many texts with the configured provider, using its EMBED_BATCH_SIZE
+    and EMBED_CONCURRENCY. Chunks already in the embedding store are not re-sent.
+    Falls back to a batched Ollama call if the provider fails.
+    """
     try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries", "format=duration", 
-             "-of", "default=noprint_wrappers=1:nokey=1", file_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-        duration = float(result.stdout)
-    except:
-        duration = None
+        embedding_provider = get_registry().get_embedding_provider()
+        embeddings = embedding_provider.get_embeddings()
+        return embed_cached(embeddings, texts, lambda missing: embed_documents_concurrent(
+            embeddings,
+            missing,
+            batch_size=embedding_provider.EMBED_BATCH_SIZE,
+            max_in_flight=embedding_provider.EMBED_CONCURRENCY,
+        ))
+    except Exception as e:
+        logger.warning("Error generating batch embeddings via provider: %s", e)
+        try:
+            import ollama
+            OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
+            client = ollama.Client(host=OLLAMA_HOST)
+            return client.embed(model="nomic-embed-text", input=texts)["embeddings"]
+        except Exception as e2:
+            logger.error("Fallback embedding also failed: %s", e2)
+            return []
+
 
-    segments, info = model.transcribe(file_path, beam_size=5)
+def transcribe_segments(
+    file_path: str,
+    offset: float = 0.0,
+    keep_from: Optional[float] = None,
+    keep_before: Optional[float] = None
+) -> List[tuple]:
+    """
+    Transcribe an audio file into (start_seconds, end_seconds, text) segments.
+    
+    Args:
+        file_path: Path to the audio file
+        offset: Seconds added to every timestamp, for files that are a chunk of a longer recording
+        keep_from: Drop words starting before this time, for chunks that overlap the previous one
+        keep_before: Drop words starting at or after this time, for chunks that overlap the next one
+    """
+    model = get_whisper_model()
+    # Trimming to the seams works per word, so a line crossing one is split rather than lost
+    trim = keep_from is not None or keep_before is not None
+    
+    # Whisper reports the duration in `info`, which drives the progress bar
+    if isinstance(model, BatchedInferencePipeline):
+        segments, info = model.transcribe(file_path, beam_size=5, batch_size=WHISPER_BATCH_SIZE, word_timestamps=trim)
+    else:
+        segments, info = model.transcribe(file_path, beam_size=5, word_timestamps=trim)
     
-    formatted_text = ""
+    results = []
     last_pos = 0
     
     with tqdm(total=info.duration, unit="s", desc="Transcribing", 
               bar_format="{l_bar}{bar}| {n:.1f}/{total:.1f}s [{elapsed}<{remaining}]") as pbar:
         for segment in segments:
-            start = format_timestamp(segment.start)
-            end = format_timestamp(segment.end)
-            formatted_text += f"\n[{start} - {end}] {segment.text.strip()}\n"
+            if not trim:
+                results.append((segment.start + offset, segment.end + offset, segment.text.strip()))
+            else:
+                words = [
+                    word for word in segment.words or []
+                    if (keep_from is None or word.start + offset >= keep_from)
+                    and (keep_before is None or word.start + offset < keep_before)
+                ]
+                if words:
+                    text = "".join(word.word for word in words).strip()
+                    results.append((words[0].start + offset, words[-1].end + offset, text))
             pbar.update(segment.end - last_pos)
             last_pos = segment.end
             
-    return formatted_text
+    return results
+
+
+def format_transcript(segments: List[tuple]) -> str:
+    """Render (start, end, text) segments as timestamped transcript lines."""
+    return "".join(
+        f"\n[{format_timestamp(start)} - {format_timestamp(end)}] {text}\n"
+        for start, end, text in segments
+    )
+
+
+def transcribe_audio(file_path: str, offset: float = 0.0) -> str:
+    """
+    Transcribe an audio file into timestamped lines.
+    
+    Args:
+        file_path: Path to the audio file
+        offset: Seconds added to every timestamp, for files that are a chunk of a longer recording
+    """
+    return format_transcript(transcribe_segments(file_path, offset))
 
 
 def format_timestamp(seconds: float) -> str:
@@ -143,38 +264,39 @@ def process_document(notebook_id: str, file_path: str, content: str, source_type
             source_type=source_type,
             content=content
         )
-        print(f"Processed {num_chunks} chunks for notebook {notebook_id}")
+        logger.info("Processed %d chunks for notebook %s", num_chunks, notebook_id)
     except Exception as e:
-        print(f"Error processing with RAG chain: {e}")
+        logger.warning("Error processing with RAG chain: %s", e)
         # Fallback to legacy processing
         _legacy_process_document(notebook_id, file_path, content, source_type, source_name)
 
 
+# 500-character chunks with 50 characters of overlap, cut at paragraph/line/word boundaries
+_legacy_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+
+
 def _legacy_process_document(notebook_id: str, file_path: str, content: str, source_type: str, source_name: str):
     """Legacy document processing using direct ChromaDB."""
-    chunk_size = 500
-    overlap = 50
-    chunks = []
+    chunks = _legacy_splitter.split_text(content)
     
-    for i in range(0, len(content), chunk_size - overlap):
-        chunks.append(content[i:i + chunk_size])
-        
-    print(f"[Legacy] Processing {len(chunks)} chunks for notebook {notebook_id}")
+    logger.info("[Legacy] Processing %d chunks for notebook %s", len(chunks), notebook_id)
     
-    for i, chunk in enumerate(chunks):
-        embedding = get_embeddings(chunk)
-        if embedding:
-            collection.add(
-                ids=[f"{notebook_id}_{source_name}_{i}"],
-                embeddings=[embedding],
-                documents=[chunk],
-                metadatas=[{
-                    "notebook_id": notebook_id,
-                    "source_name": source_name,
-                    "source_type": source_type,
-                    "chunk_index": i
-                }]
-            )
+    embeddings = get_embeddings_batch(chunks)
+    if not embeddings:
+        return
+    
+    # Upsert so re-ingesting a source overwrites its chunks instead of failing on existing IDs
+    collection.upsert(
+        ids=[f"{notebook_id}_{source_name}_{i}" for i in range(len(chunks))],
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+        documents=chunks,
+        metadatas=[{
+            "notebook_id": notebook_id,
+            "source_name": source_name,
+            "source_type": source_type,
+            "chunk_index": i
+        } for i in range(len(chunks))]
+    )
 
 
 def delete_source_documents(notebook_id: str, source_name: str):
@@ -182,7 +304,7 @@ def delete_source_documents(notebook_id: str, source_name: str):
         rag_chain = get_rag_chain()
         rag_chain.delete_source(notebook_id, source_name)
     except Exception as e:
-        print(f"RAG chain delete failed, using legacy: {e}")
+        logger.warning("RAG chain delete failed, using legacy: %s", e)
         # Fallback to legacy
         try:
             collection.delete(
@@ -194,10 +316,10 @@ def delete_source_documents(notebook_id: str, source_name: str):
                 }
             )
         except Exception as e2:
-            print(f"Error deleting document: {e2}")
+            logger.error("Error deleting document: %s", e2)
 
 
-def query_rag_context(
+async def query_rag_context(
     notebook_id: str, 
     query: str, 
     n_results: int = 5, 
@@ -212,7 +334,9 @@ def query_rag_context(
     """
     try:
         rag_chain = get_rag_chain()
-        context, citation_info = rag_chain.retrieve_context(
+        # Retrieval makes blocking embedding and ChromaDB calls; keep them off the event loop
+        context, citation_info = await asyncio.to_thread(
+            rag_chain.retrieve_context,
             notebook_id=notebook_id,
             query=query,
             selected_sources=selected_sources,
@@ -231,32 +355,37 @@ def query_rag_context(
         
         return context, source_map, citation_details
     except Exception as e:
-        print(f"RAG chain query failed, using legacy: {e}")
-        return _legacy_query_rag_context(notebook_id, query, n_results, selected_sources)
+        logger.warning("RAG chain query failed, using legacy: %s", e)
+        return await _legacy_query_rag_context(notebook_id, query, n_results, selected_sources)
 
 
-def _legacy_query_rag_context(
+@lru_cache(maxsize=1024)
+def _build_where(notebook_id: str, selected_sources: Tuple[str, ...]) -> Dict[str, Any]:
+    """ChromaDB filter for a notebook, optionally narrowed to some sources. Callers must not mutate it."""
+    if not selected_sources:
+        return {"notebook_id": notebook_id}
+    return {
+        "$and": [
+            {"notebook_id": notebook_id},
+            {"source_name": {"$in": list(selected_sources)}}
+        ]
+    }
+
+
+async def _legacy_query_rag_context(
     notebook_id: str, 
     query: str, 
     n_results: int = 5, 
     selected_sources: List[str] = None
 ) -> Tuple[str, Dict[str, int], Dict[int, Dict]]:
     """Legacy RAG context retrieval."""
-    query_vector = get_embeddings(query)
+    query_vector = await aget_embeddings(query)
     
-    where_filter = {"notebook_id": notebook_id}
-    if selected_sources:
-        where_filter = {
-            "$and": [
-                {"notebook_id": notebook_id},
-                {"source_name": {"$in": selected_sources}}
-            ]
-        }
-
-    results = collection.query(
-        query_embeddings=[query_vector],
+    results = await asyncio.to_thread(
+        collection.query,
+        query_embeddings=np.asarray([query_vector], dtype=np.float32),
         n_results=n_results,
-        where=where_filter
+        where=_build_where(notebook_id, tuple(sorted(selected_sources or ())))
     )
     
     context = ""
@@ -294,19 +423,42 @@ async def stream_chat_response(
     """
     Stream chat response with RAG context.
     Delegates to the RAGChain for better context handling and LangChain compatibility.
+    With LLM_RESPONSE_CACHE=1, completed responses are replayed for identical requests.
     """
     rag_chain = get_rag_chain()
     
+    cache_key = None
+    if RESPONSE_CACHE:
+        registry = get_registry()
+        cache_key = _cache.hash_text(json.dumps({
+            "provider": registry.get_chat_provider().name,
+            "model": registry.get_chat_model_name(),
+            "generation": _cache.get_generation(notebook_id),
+            "notebook": notebook_id,
+            "messages": messages,
+            "sources": sorted(selected_sources or []),
+            "full": full_source_content,
+        }, sort_keys=True))
+        cached = _cache.response_cache.get(cache_key)
+        if cached is not None:
+            for chunk in cached:
+                yield chunk
+            return
+    
     try:
+        chunks = []
         async for chunk in rag_chain.stream_response(
             notebook_id=notebook_id,
             messages=messages,
             selected_sources=selected_sources,
             full_source_content=full_source_content
         ):
+            chunks.append(chunk)
             yield chunk
+        if cache_key is not None:
+            _cache.response_cache.set(cache_key, chunks)
     except Exception as e:
-        print(f"Streaming error: {e}")
+        logger.error("Streaming error: %s", e)
         yield f"Error generating response: {str(e)}"
 
 